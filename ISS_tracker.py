@@ -2,7 +2,11 @@
 import requests
 import folium
 import time
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from datetime import datetime
+from collections import deque
 import webbrowser
 import os
 
@@ -16,11 +20,17 @@ MAP_FILENAME = "ISS/iss_location.html"  # Output map filename (now inside ISS fo
 MAP_ZOOM = 5              # Default zoom level for the map (higher = more zoomed in)
 AUTO_REFRESH_SECONDS = 20 # Interval (seconds) for browser auto-refresh
 
+# Shared session so every poll reuses the same keep-alive connection
+SESSION = requests.Session()
+adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+SESSION.mount("https://", adapter)
+SESSION.mount("http://", adapter)
+
 
 def get_iss_location():
     url = "http://api.open-notify.org/iss-now.json"
     try:
-        response = requests.get(url, timeout=10)
+        response = SESSION.get(url, timeout=10)
         if response.status_code == 200:
             data = response.json()
             position = data['iss_position']
@@ -34,73 +44,133 @@ def get_iss_location():
         print(f"Error fetching ISS location: {e}")
         return None
 
+def save_map_atomic(m, filename):
+    """Save to a temp file beside filename, then swap it in so a reload never sees a partial page."""
+    # Same directory keeps os.replace a rename (tmpfs like /dev/shm would be another filesystem)
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    m.save(tmp)
+    os.replace(tmp, filename)
+
+def new_map(loc):
+    """Base map with the auto-refresh script; returns (map, figure entries every render keeps)."""
+    m = folium.Map(location=loc, zoom_start=MAP_ZOOM)
+    # Auto-refresh is part of the map tree so save() writes it in one pass
+    refresh_script = f"<script>setTimeout(function(){{window.location.reload();}}, {AUTO_REFRESH_SECONDS * 1000});</script>"
+    root = m.get_root()
+    root.header.add_child(folium.Element(refresh_script))
+    base = {el: set(el._children) for el in (root.header, root.html, root.script)}
+    return m, base
+
+def prune_rendered(m, base):
+    """Drop figure entries filed by earlier renders, so evicted markers don't stay on the page.
+
+    Every render files each element's JS under its own name and never removes it; the next
+    render re-files whatever is still on the map.
+    """
+    for el, keep in base.items():
+        el._children = {k: v for k, v in el._children.items() if k in keep}
+
+def add_fix(m, history, current, loc, key):
+    """Put loc on the map as the current fix; returns the new current (lat, lon, key)."""
+    # Demote the previous fix to a gray marker, evicting the oldest one when full
+    if current and history.maxlen:
+        lat, lon, prev_key = current
+        if len(history) == history.maxlen:
+            m._children.pop(history[0], None)
+        m.add_child(folium.CircleMarker(
+            location=[lat, lon],
+            radius=3,
+            color='lightgray',
+            fill=True,
+            fill_color='lightgray',
+            fill_opacity=0.6,
+            popup=f"Lat: {lat}, Lon: {lon}"
+        ), name=prev_key)
+        history.append(prev_key)
+    # Add current location as red marker (fixed key replaces the old one)
+    m.add_child(folium.Marker(
+        location=loc,
+        popup="Current ISS Location",
+        icon=folium.Icon(color="red", icon="rocket", prefix="fa")
+    ), name="current")
+    m.location = list(loc)
+    return (loc[0], loc[1], key)
+
+def render_map(m, base, lock, count):
+    """Save the map on the render thread, holding lock so the main loop can't edit it mid-render."""
+    with lock:
+        prune_rendered(m, base)
+        save_map_atomic(m, MAP_FILENAME)
+    print(f"Map has been saved as {MAP_FILENAME} with {count} locations (last {ROLLING_HOURS} hours).")
+
 def main():
     total_duration = TRACKING_HOURS * 60 * 60
-    rolling_window = ROLLING_HOURS * 60 * 60
+    # Fixes that fit in the rolling window; the deque evicts the oldest in O(1)
+    window_size = max(1, int(ROLLING_HOURS * 60 * 60 // INTERVAL_SECONDS))
     iterations = total_duration // INTERVAL_SECONDS
 
-    locations = []
-    timestamps = []
     print(f"Tracking ISS for {TRACKING_HOURS} hours, updating every {INTERVAL_SECONDS} seconds...")
     start_time = datetime.now()
 
+    # Map is built once, then markers are added/removed by child key each tick
+    m = base = None
+    history = deque(maxlen=window_size - 1)  # child keys of gray markers on the map
+    current = None  # (lat, lon, key) of the latest fix
+    tracked = 0
+
+    # Rendering runs on one background thread so the next fetch isn't held up by it;
+    # the lock keeps the main loop from editing the map while it's being serialized
+    executor = ThreadPoolExecutor(max_workers=1)
+    render_lock = threading.Lock()
+    pending_render = None
+    dirty = False  # map changed since the last submitted render
+
     browser_opened = False
+    # Fixed-rate schedule: time spent fetching/rendering comes out of the wait
+    next_tick = time.monotonic()
     for i in range(int(iterations)):
+        next_tick += INTERVAL_SECONDS
         loc = get_iss_location()
         now = datetime.now()
         if loc:
-            locations.append(loc)
-            timestamps.append(now)
+            tracked += 1
             print(f"[{now.strftime('%H:%M:%S')}] ISS Location: Lat {loc[0]}, Lon {loc[1]}")
+            with render_lock:
+                if m is None:
+                    m, base = new_map(loc)
+                current = add_fix(m, history, current, loc, f"pt_{i}")
         else:
             print(f"[{now.strftime('%H:%M:%S')}] Skipped due to error.")
 
-        # Filter locations to only last ROLLING_HOURS
-        cutoff = datetime.now() - timedelta(seconds=rolling_window)
-        filtered = [(lat, lon) for (lat, lon), ts in zip(locations, timestamps) if ts >= cutoff]
-        if filtered:
-            m = folium.Map(location=filtered[-1], zoom_start=MAP_ZOOM)
-            # Add previous locations as gray markers
-            for lat, lon in filtered[:-1]:
-                folium.CircleMarker(
-                    location=[lat, lon],
-                    radius=3,
-                    color='lightgray',
-                    fill=True,
-                    fill_color='lightgray',
-                    fill_opacity=0.6,
-                    popup=f"Lat: {lat}, Lon: {lon}"
-                ).add_to(m)
-            # Add current location as red marker
-            folium.Marker(
-                location=filtered[-1],
-                popup="Current ISS Location",
-                icon=folium.Icon(color="red", icon="rocket", prefix="fa")
-            ).add_to(m)
-            m.save(MAP_FILENAME)
-            # Inject auto-refresh JavaScript
-            try:
-                with open(MAP_FILENAME, "r+") as f:
-                    html = f.read()
-                    refresh_script = f"<script>setTimeout(function(){{window.location.reload();}}, {AUTO_REFRESH_SECONDS * 1000});</script>"
-                    if "window.location.reload" not in html:
-                        html = html.replace("</head>", refresh_script + "\n</head>")
-                        f.seek(0)
-                        f.write(html)
-                        f.truncate()
-            except Exception as e:
-                print(f"Failed to inject auto-refresh: {e}")
-            print(f"Map has been saved as {MAP_FILENAME} with {len(filtered)} locations (last {ROLLING_HOURS} hours).")
+        if not current:
+            print(f"No locations in the last {ROLLING_HOURS} hours to display.")
+        else:
+            dirty = dirty or bool(loc)
+            # Only the newest map matters: while a render is still running, changes just
+            # pile up and go out with the next one
+            if dirty and (pending_render is None or pending_render.done()):
+                if pending_render is not None and pending_render.exception():
+                    print(f"Failed to save map: {pending_render.exception()}")
+                pending_render = executor.submit(render_map, m, base, render_lock, len(history) + 1)
+                dirty = False
             # Open browser on first update using absolute path
             if not browser_opened:
+                pending_render.result()
                 abs_path = os.path.abspath(MAP_FILENAME)
                 webbrowser.open(f"file://{abs_path}")
                 browser_opened = True
-        else:
-            print(f"No locations in the last {ROLLING_HOURS} hours to display.")
-        time.sleep(INTERVAL_SECONDS)
+        time.sleep(max(0.0, next_tick - time.monotonic()))
 
-    if not locations:
+    executor.shutdown(wait=True)
+    # The last background render is never polled by the loop; report it here
+    if pending_render is not None and pending_render.exception():
+        print(f"Failed to save map: {pending_render.exception()}")
+    if dirty:
+        try:
+            render_map(m, base, render_lock, len(history) + 1)
+        except Exception as e:
+            print(f"Failed to save map: {e}")
+    if not tracked:
         print("No locations tracked.")
 
 if __name__ == "__main__":
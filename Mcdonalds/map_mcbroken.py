@@ -1,6 +1,4 @@
 
-import csv
-
 # =====================
 # Adjustable Variables
 # =====================
@@ -9,85 +7,147 @@ STATUS_FILTER = None  # 'working' or 'broken' or None
 CITY = None  # e.g. 'Chicago' or None
 
 import json
+import hashlib
+import numpy as np
+import pandas as pd
 import folium
-from folium.plugins import MarkerCluster
+import requests
+from folium.plugins import FastMarkerCluster
+from requests.adapters import HTTPAdapter
 import os
 import datetime
 import time
 
+try:
+    import orjson  # much faster JSON decode; stdlib json is used if missing
+except ImportError:
+    orjson = None
+
+# Shared keep-alive session for the periodic markers.json download
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
 # Example marker format (replace with actual data if available)
 # [
 #   {"lat": 40.7128, "lng": -74.0060, "status": "working", "address": "New York, NY"},
 #   {"lat": 34.0522, "lng": -118.2437, "status": "broken", "address": "Los Angeles, CA"}
 # ]
 
+def _load_json(raw):
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
 def geojson_to_csv(json_path, csv_path):
-    with open(json_path, "r") as f:
-        geojson = json.load(f)
+    with open(json_path, "rb") as f:
+        geojson = _load_json(f.read())
     header = ["lat", "lng", "status", "country", "state", "city", "street", "last_checked"]
-    with open(csv_path, "w", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(header)
-        for feature in geojson.get("features", []):
-            coords = feature["geometry"]["coordinates"]
-            props = feature["properties"]
-            lat = float(coords[1])
-            lng = float(coords[0])
-            status = "working" if not props.get("is_broken") else "broken"
-            country = props.get("country", "")
-            state = props.get("state", "")
-            city = props.get("city", "")
-            street = props.get("street", "")
-            last_checked = props.get("last_checked", "")
-            writer.writerow([lat, lng, status, country, state, city, street, last_checked])
+    # Flatten all features at once; nested keys become "geometry.coordinates", "properties.city", ...
+    df = pd.json_normalize(geojson.get("features", []))
+    if df.empty:
+        pd.DataFrame(columns=header).to_csv(csv_path, index=False)
+        return
+    coords = pd.DataFrame(df["geometry.coordinates"].tolist(), index=df.index)
+    df["lat"] = coords[1].astype(float)
+    df["lng"] = coords[0].astype(float)
+    is_broken = df.get("properties.is_broken", pd.Series(False, index=df.index))
+    df["status"] = np.where(is_broken.fillna(False).astype(bool), "broken", "working")
+    for col in header[3:]:
+        df[col] = df.get(f"properties.{col}", pd.Series("", index=df.index)).fillna("")
+    df[header].to_csv(csv_path, index=False)
+
+def csv_is_stale(json_path, csv_path):
+    return not os.path.exists(csv_path) or os.path.getmtime(csv_path) < os.path.getmtime(json_path)
 
 def load_markers_from_csv(csv_path):
-    markers = []
-    with open(csv_path, "r") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            markers.append(row)
+    # Keep text columns as-is (empty stays "", not NaN); only coordinates are numeric
+    markers = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    markers["lat"] = markers["lat"].astype(float)
+    markers["lng"] = markers["lng"].astype(float)
     return markers
 
 def fetch_mcbroken_markers(json_path):
-    import requests
+    """Download markers.json; returns None (json_path untouched) if the server answers 304."""
     url = "https://mcbroken.com/markers.json"
-    response = requests.get(url)
+    meta_path = os.path.join(os.path.dirname(json_path), "mcbroken_meta.json")
+    # Only send validators when we still have the body they describe
+    meta = {}
+    if os.path.exists(json_path) and os.path.exists(meta_path):
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    response = SESSION.get(url, headers=headers, timeout=30)
+    if response.status_code == 304:
+        return None
     response.raise_for_status()
-    data = response.json()
-    with open(json_path, "w") as f:
-        json.dump(data, f)
+    # Persist the bytes as received instead of decoding and re-encoding them
+    raw = response.content
+    with open(json_path, "wb") as f:
+        f.write(raw)
+    data = _load_json(raw)
+    with open(meta_path, "w") as f:
+        json.dump({
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }, f)
     return data
 
-def create_map(markers, output_path, status_filter=None, city=None):
+# Same look as folium.Icon(color=..., icon="info-sign"): green = working, red = broken
+MARKER_CALLBACK_JS = """
+function (row) {
+    var icon = L.AwesomeMarkers.icon({
+        icon: "info-sign",
+        prefix: "glyphicon",
+        iconColor: "white",
+        markerColor: row[3] === "working" ? "green" : "red"
+    });
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(row[2]);
+    return marker;
+}
+"""
+
+def build_city_index(markers):
+    """Lower-cased city -> (lat, lng) of its first store, in file order."""
+    cities = markers["city"].str.lower()
+    first = ~cities.duplicated()
+    return dict(zip(cities[first], zip(markers["lat"][first], markers["lng"][first])))
+
+def find_city_center(city_index, city):
+    key = city.lower()
+    if key in city_index:
+        return city_index[key]
+    # Same substring match as before, but over unique city names instead of every store
+    return next((center for name, center in city_index.items() if key in name), None)
+
+def create_map(markers, output_path, status_filter=None, city=None, city_index=None):
     # Center map on North America, zoomed out to show the world
     map_center = [40, -100]
     zoom = 3
     if city:
-        city_marker = next((m for m in markers if city.lower() in m.get("city", "").lower()), None)
-        if city_marker:
-            map_center = [float(city_marker["lat"]), float(city_marker["lng"])]
+        if city_index is None:
+            city_index = build_city_index(markers)
+        city_center = find_city_center(city_index, city)
+        if city_center:
+            map_center = [float(city_center[0]), float(city_center[1])]
             zoom = 10
     m = folium.Map(location=map_center, zoom_start=zoom)
     # Filter markers by status if requested
     if status_filter:
-        markers = [m for m in markers if m.get("status") == status_filter]
-    marker_cluster = MarkerCluster().add_to(m)
+        markers = markers[markers["status"] == status_filter]
     ice_cream_icon = '🍦'
-    for marker in markers:
-        lat = float(marker["lat"])
-        lng = float(marker["lng"])
-        status = marker["status"]
-        color = "green" if status == "working" else "red"
-        # Build popup with all available data
-        popup_html = "<b>Store Details:</b><br>"
-        for key, value in marker.items():
-            popup_html += f"<b>{key}:</b> {value}<br>"
-        folium.Marker(
-            location=[lat, lng],
-            popup=popup_html,
-            icon=folium.Icon(color=color, icon="info-sign"),
-        ).add_to(marker_cluster)
+    # FastMarkerCluster ships one JS array instead of a Marker object per store;
+    # rows are [lat, lng, popup_html, status] and the icon color is picked client-side
+    # Build popup with all available data, one "<b>key:</b> value<br>" column at a time
+    parts = [f"<b>{key}:</b> " + markers[key].astype(str) + "<br>" for key in markers.columns]
+    popups = "<b>Store Details:</b><br>" + parts[0].str.cat(parts[1:], sep="")
+    data = [list(row) for row in zip(markers["lat"], markers["lng"], popups, markers["status"])]
+    FastMarkerCluster(data, callback=MARKER_CALLBACK_JS).add_to(m)
     legend_html = '''
      <div style="position: fixed; 
      bottom: 50px; left: 50px; width: 260px; height: 120px; 
@@ -112,11 +172,32 @@ if __name__ == "__main__":
     json_path = os.path.join(os.path.dirname(__file__), "mcbroken_markers.json")
     csv_path = os.path.join(os.path.dirname(__file__), "mcbroken_markers.csv")
     output_path = os.path.join(os.path.dirname(__file__), "mcbroken_map.html")
+    first_run = True
+    last_hash = None  # digest of the CSV behind the current map
     while True:
-        # Convert GeoJSON to CSV for efficient storage
-        geojson_to_csv(json_path, csv_path)
-        markers = load_markers_from_csv(csv_path)
-        create_map(markers, output_path, status_filter=STATUS_FILTER, city=CITY)
+        try:
+            changed = fetch_mcbroken_markers(json_path) is not None
+        except Exception as e:
+            print(f"Failed to fetch mcbroken markers, using local copy: {e}")
+            changed = False
+        if changed or first_run:
+            # Convert GeoJSON to CSV for efficient storage (only when the JSON is newer)
+            if csv_is_stale(json_path, csv_path):
+                geojson_to_csv(json_path, csv_path)
+            # A 200 with the same payload (no ETag support) still needs no re-render
+            with open(csv_path, "rb") as f:
+                csv_hash = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+            if csv_hash == last_hash and os.path.exists(output_path):
+                print("mcbroken markers unchanged; keeping existing map.")
+            else:
+                markers = load_markers_from_csv(csv_path)
+                # Built once per data load, not per lookup
+                city_index = build_city_index(markers) if CITY else None
+                create_map(markers, output_path, status_filter=STATUS_FILTER, city=CITY, city_index=city_index)
+                last_hash = csv_hash
+        else:
+            print("mcbroken markers unchanged (HTTP 304); keeping existing map.")
+        first_run = False
         if REFRESH_RATE <= 0:
             break
         print(f"Waiting {REFRESH_RATE} seconds before refreshing...")
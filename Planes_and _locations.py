@@ -1,9 +1,12 @@
 # Planes.py
+import json
+import math
 import time
+from concurrent.futures import ThreadPoolExecutor
 import folium
 import pandas as pd
 from opensky_api import OpenSkyApi
-from folium.plugins import MarkerCluster
+from folium.plugins import FastMarkerCluster
 
 
 # Optional: add USERNAME, PASSWORD for higher limits
@@ -53,168 +56,208 @@ PREMADE_REGIONS = {
     "southern_ocean": (-90.0, -60.0, -180.0, 180.0)
 }
 
-def fetch_live_planes(region_names=None):
-    """Fetch live aircraft states from OpenSky API (optionally bounding box)."""
-    api = OpenSkyApi(USERNAME, PASSWORD) if USERNAME and PASSWORD else OpenSkyApi()
-    dfs = []
+# Per-unit (factor from API SI units, display format) for the converted popup fields
+UNIT_CONVERSIONS = {
+    "us": {
+        "velocity": (2.23694, "{:.1f} mph"),
+        "baro_altitude": (3.28084, "{:.0f} ft"),
+        "geo_altitude": (3.28084, "{:.0f} ft"),
+        "vertical_rate": (196.850, "{:.0f} ft/min"),
+    },
+    "metric": {
+        "velocity": (1.0, "{:.1f} m/s"),
+        "baro_altitude": (1.0, "{:.0f} m"),
+        "geo_altitude": (1.0, "{:.0f} m"),
+        "vertical_rate": (1.0, "{:.0f} m/min"),
+    },
+}
+
+# Emergency squawk codes (verified) and the note shown next to them in the popup
+SQUAWK_EXPLANATIONS = {
+    "7500": "Hijacking (emergency)",
+    "7600": "Radio failure (emergency)",
+    "7700": "General emergency",
+}
+
+# Icon selection based on category
+# OpenSky category codes: 1=light, 2=small, 3=large, 4=high perf, 5=heavy, 6=rotorcraft, 7=glider, 8=balloon, 9=unknown
+ICON_BY_CATEGORY = {4: "fighter-jet", 6: "helicopter"}
+
+# Plane popup, filled per row with str.format_map
+POPUP_TEMPLATE = """
+        <div style='font-family: Arial, sans-serif; font-size: 13px; min-width: 220px;'>
+            <table style='width:100%; border-collapse:collapse;'>
+                <tr><th colspan='2' style='background:#4FC3F7; color:#fff; padding:4px; border-radius:4px 4px 0 0;'>✈️ {callsign} ({origin_country})</th></tr>
+                <tr><td><b>Altitude</b></td><td>{baro_altitude_str}</td></tr>
+                <tr><td><b>Geo Altitude</b></td><td>{geo_altitude_str}</td></tr>
+                <tr><td><b>Velocity</b></td><td>{velocity_str}</td></tr>
+                <tr><td><b>Vertical Rate</b></td><td>{vertical_rate_str}</td></tr>
+                <tr><td><b>Heading</b></td><td>{heading}°</td></tr>
+                <tr><td><b>On Ground</b></td><td>{on_ground}</td></tr>
+                <tr><td><b>SPI</b></td><td>{spi}</td></tr>
+                <tr><td><b>Position Source</b></td><td>{position_source}</td></tr>
+                <tr><td><b>Category</b></td><td>{category}</td></tr>
+                <tr><td><b>Squawk</b></td><td>{squawk} {squawk_explanation}</td></tr>
+                <tr><td><b>Time Position</b></td><td>{time_position}</td></tr>
+                <tr><td><b>Last Contact</b></td><td>{last_contact}</td></tr>
+            </table>
+        </div>
+        """
+
+# DataFrame column -> OpenSky StateVector attribute
+STATE_COLUMNS = {
+    "icao24": "icao24",
+    "callsign": "callsign",
+    "origin_country": "origin_country",
+    "longitude": "longitude",
+    "latitude": "latitude",
+    "baro_altitude": "baro_altitude",
+    "geo_altitude": "geo_altitude",
+    "velocity": "velocity",
+    "vertical_rate": "vertical_rate",
+    "heading": "true_track",
+    "on_ground": "on_ground",
+    "spi": "spi",
+    "position_source": "position_source",
+    "category": "category",
+    "time_position": "time_position",
+    "last_contact": "last_contact",
+    "squawk": "squawk",
+}
+
+# Airborne icons are rotated in HEADING_BUCKET_DEG steps so their markup repeats
+HEADING_BUCKET_DEG = 5
+
+def plane_icon_html(icon_name, icon_color, heading_bucket):
+    """DivIcon markup for an airborne plane (circle background + rotated Font Awesome icon)."""
+    plane_style = f"transform: rotate({heading_bucket}deg);" if heading_bucket is not None else ""
+    return f"""
+            <div style='position: relative; width: 32px; height: 32px;'>
+                <span style='display: block; width: 32px; height: 32px; border-radius: 50%; background: #e0e0e0; position: absolute; top: 0; left: 0;'></span>
+                <i class='fa fa-{icon_name}' style='font-size: 20px; color: {icon_color}; position: absolute; top: 6px; left: 6px; {plane_style}'></i>
+            </div>
+            """
+
+# FastMarkerCluster callback; %s is the icon table [["div", html] | ["awesome", name, color], ...].
+# Leaflet icons are plain option objects, so one instance per table entry serves every marker.
+PLANE_CALLBACK_JS = """
+(function () {
+    var icons = %s.map(function (spec) {
+        if (spec[0] === "div") {
+            return L.divIcon({html: spec[1], className: "empty", iconSize: [32, 32], iconAnchor: [16, 16], popupAnchor: [0, -16]});
+        }
+        return L.AwesomeMarkers.icon({icon: spec[1], markerColor: spec[2], prefix: "fa", iconColor: "white"});
+    });
+    return function (row) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icons[row[3]]});
+        marker.bindPopup(row[2]);
+        return marker;
+    };
+})()
+"""
+
+def resolve_regions(region_names):
+    """Turn region names into bounding boxes; unknown names are a config error, not worldwide."""
     # If no region specified, use worldwide
     if not region_names:
         region_names = ["worldwide"]
-    for region in region_names:
-        bbox = PREMADE_REGIONS.get(region, PREMADE_REGIONS["worldwide"])
-        states = api.get_states(bbox=bbox)
-        records = []
+    unknown = [r for r in region_names if r not in PREMADE_REGIONS]
+    if unknown:
+        raise ValueError(f"Unknown region(s) {unknown} in FILTER_REGION_NAME. Options: {', '.join(PREMADE_REGIONS)}")
+    return [PREMADE_REGIONS[r] for r in region_names]
+
+# Checked once at import so a typo fails fast instead of silently fetching the whole globe
+REGION_BBOXES = resolve_regions(FILTER_REGION_NAME)
+
+def fetch_region_states(bbox):
+    """Fetch OpenSky states for one bounding box (runs in a worker thread)."""
+    # One client per call: OpenSkyApi throttles repeat get_states calls per instance
+    api = OpenSkyApi(USERNAME, PASSWORD) if USERNAME and PASSWORD else OpenSkyApi()
+    return api.get_states(bbox=bbox)
+
+def fetch_live_planes(bboxes=REGION_BBOXES):
+    """Fetch live aircraft states from OpenSky API for each (min_lat, max_lat, min_lon, max_lon) box."""
+    # Regions are independent HTTP calls, so wait on all of them at once
+    with ThreadPoolExecutor(max_workers=len(bboxes)) as ex:
+        region_states = list(ex.map(fetch_region_states, bboxes))
+    # Fill one list per column across all regions, then build a single DataFrame
+    cols = {col: [] for col in STATE_COLUMNS}
+    for states in region_states:
         if states and states.states:
             for s in states.states:
-                records.append({
-                    "icao24": s.icao24,
-                    "callsign": s.callsign,
-                    "origin_country": s.origin_country,
-                    "longitude": s.longitude,
-                    "latitude": s.latitude,
-                    "baro_altitude": s.baro_altitude,
-                    "geo_altitude": getattr(s, 'geo_altitude', None),
-                    "velocity": s.velocity,
-                    "vertical_rate": getattr(s, 'vertical_rate', None),
-                    "heading": getattr(s, 'true_track', None),
-                    "on_ground": getattr(s, 'on_ground', None),
-                    "spi": getattr(s, 'spi', None),
-                    "position_source": getattr(s, 'position_source', None),
-                    "category": getattr(s, 'category', None),
-                    "time_position": getattr(s, 'time_position', None),
-                    "last_contact": getattr(s, 'last_contact', None),
-                    "squawk": s.squawk
-                })
-        dfs.append(pd.DataFrame(records))
-    if dfs:
-        return pd.concat(dfs, ignore_index=True)
-    return pd.DataFrame()
+                for col, attr in STATE_COLUMNS.items():
+                    cols[col].append(getattr(s, attr, None))
+    return pd.DataFrame(cols)
 
 
 def make_map(df, filename=MAP_FILENAME, auto_refresh_seconds=AUTO_REFRESH_SECONDS, zoom_start=MAP_ZOOM, units=UNITS):
     """Generate an interactive map with plane markers and auto-refresh."""
+    # Planes without a position can't be drawn, so drop them before any per-row work
+    if not df.empty:
+        df = df.dropna(subset=["latitude", "longitude"])
     if df.empty:
         print("No planes found.")
         return None
 
+    df = df.copy()
+    # Measurements are only shown rounded, float32 is plenty (coordinates/heading stay float64)
+    for col in UNIT_CONVERSIONS["us"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce", downcast="float")
+    # Small nullable ints so category lookups compare ints, not NaN-padded floats
+    df["category"] = pd.to_numeric(df["category"], errors="coerce").astype("Int8")
+
     # Center map around mean lat/lon
     center_lat = df["latitude"].mean()
     center_lon = df["longitude"].mean()
 
     m = folium.Map(location=[center_lat, center_lon], zoom_start=zoom_start)
-    marker_cluster = MarkerCluster().add_to(m)
-
-    for _, row in df.iterrows():
-        velocity_mps = row['velocity']
-        baro_altitude_m = row['baro_altitude']
-        geo_altitude_m = row.get('geo_altitude', None)
-        vertical_rate_mps = row.get('vertical_rate', None)
-
-        if units == "us":
-            velocity = velocity_mps * 2.23694 if velocity_mps is not None else 'N/A'
-            velocity_str = f"{velocity:.1f} mph" if velocity_mps is not None else 'N/A'
-            baro_altitude = baro_altitude_m * 3.28084 if baro_altitude_m is not None else 'N/A'
-            baro_altitude_str = f"{baro_altitude:.0f} ft" if baro_altitude_m is not None else 'N/A'
-            geo_altitude = geo_altitude_m * 3.28084 if geo_altitude_m is not None else 'N/A'
-            geo_altitude_str = f"{geo_altitude:.0f} ft" if geo_altitude_m is not None else 'N/A'
-            vertical_rate = vertical_rate_mps * 196.850 if vertical_rate_mps is not None else 'N/A'
-            vertical_rate_str = f"{vertical_rate:.0f} ft/min" if vertical_rate_mps is not None else 'N/A'
-        else:
-            velocity = velocity_mps if velocity_mps is not None else 'N/A'
-            velocity_str = f"{velocity:.1f} m/s" if velocity_mps is not None else 'N/A'
-            baro_altitude = baro_altitude_m if baro_altitude_m is not None else 'N/A'
-            baro_altitude_str = f"{baro_altitude:.0f} m" if baro_altitude_m is not None else 'N/A'
-            geo_altitude = geo_altitude_m if geo_altitude_m is not None else 'N/A'
-            geo_altitude_str = f"{geo_altitude:.0f} m" if geo_altitude_m is not None else 'N/A'
-            vertical_rate = vertical_rate_mps if vertical_rate_mps is not None else 'N/A'
-            vertical_rate_str = f"{vertical_rate:.0f} m/min" if vertical_rate_mps is not None else 'N/A'
-
-        squawk = row.get('squawk', 'N/A')
-        squawk_explanation = ""
-        if squawk and squawk != 'N/A':
-            squawk_explanations = {
-                "7500": "Hijacking (emergency)",
-                "7600": "Radio failure (emergency)",
-                "7700": "General emergency",
-            }
-            if str(squawk) in squawk_explanations:
-                squawk_explanation = f"<span style='color:#d32f2f;'><b>({squawk_explanations[str(squawk)]})</b></span>"
-        popup_text = f"""
-        <div style='font-family: Arial, sans-serif; font-size: 13px; min-width: 220px;'>
-            <table style='width:100%; border-collapse:collapse;'>
-                <tr><th colspan='2' style='background:#4FC3F7; color:#fff; padding:4px; border-radius:4px 4px 0 0;'>✈️ {row['callsign'] or 'Unknown'} ({row['origin_country']})</th></tr>
-                <tr><td><b>Altitude</b></td><td>{baro_altitude_str}</td></tr>
-                <tr><td><b>Geo Altitude</b></td><td>{geo_altitude_str}</td></tr>
-                <tr><td><b>Velocity</b></td><td>{velocity_str}</td></tr>
-                <tr><td><b>Vertical Rate</b></td><td>{vertical_rate_str}</td></tr>
-                <tr><td><b>Heading</b></td><td>{row['heading']}°</td></tr>
-                <tr><td><b>On Ground</b></td><td>{row.get('on_ground', 'N/A')}</td></tr>
-                <tr><td><b>SPI</b></td><td>{row.get('spi', 'N/A')}</td></tr>
-                <tr><td><b>Position Source</b></td><td>{row.get('position_source', 'N/A')}</td></tr>
-                <tr><td><b>Category</b></td><td>{row.get('category', 'N/A')}</td></tr>
-                <tr><td><b>Squawk</b></td><td>{squawk} {squawk_explanation}</td></tr>
-                <tr><td><b>Time Position</b></td><td>{row.get('time_position', 'N/A')}</td></tr>
-                <tr><td><b>Last Contact</b></td><td>{row.get('last_contact', 'N/A')}</td></tr>
-            </table>
-        </div>
-        """
 
-        # Emergency squawk codes (verified):
-        emergency_squawks = {"7500", "7600", "7700"}
-        is_emergency = str(squawk) in emergency_squawks
-        icon_color = "red" if is_emergency else ("green" if row.get('on_ground', False) else "#4FC3F7")
-
-        # Icon selection based on category
-        # OpenSky category codes: 1=light, 2=small, 3=large, 4=high perf, 5=heavy, 6=rotorcraft, 7=glider, 8=balloon, 9=unknown
-        category = row.get('category', None)
-        if category == 4:
-            icon_name = "fighter-jet"
-        elif category == 6:
-            icon_name = "helicopter"
-        else:
-            icon_name = "plane"
+    # Unit conversion + formatting for the whole column at once (missing -> 'N/A')
+    for col, (factor, fmt) in UNIT_CONVERSIONS["us" if units == "us" else "metric"].items():
+        values = pd.to_numeric(df[col], errors="coerce") * factor
+        df[f"{col}_str"] = values.map(fmt.format, na_action="ignore").fillna("N/A")
+
+    # Markers go to the browser as one [lat, lon, popup, icon_index] array; each distinct
+    # icon is listed once in icon_specs and shared by index
+    icon_specs = {}
+    data = []
+    for row in df.itertuples(index=False):
+        squawk = row.squawk
+        is_emergency = str(squawk) in SQUAWK_EXPLANATIONS
+        squawk_explanation = f"<span style='color:#d32f2f;'><b>({SQUAWK_EXPLANATIONS[str(squawk)]})</b></span>" if is_emergency else ""
+        popup_text = POPUP_TEMPLATE.format_map({
+            **row._asdict(),
+            "callsign": row.callsign or "Unknown",
+            "squawk_explanation": squawk_explanation,
+        })
+
+        icon_color = "red" if is_emergency else ("green" if row.on_ground else "#4FC3F7")
+        icon_name = ICON_BY_CATEGORY.get(row.category, "plane")
 
         # Use base circle as background for airborne planes
-        if not row.get('on_ground', False) and row.get('heading') is not None:
+        if not row.on_ground and row.heading is not None:
             try:
-                heading = float(row.get('heading'))
-                plane_style = f"transform: rotate({heading}deg);"
+                heading = float(row.heading)
+                heading_bucket = round(heading / HEADING_BUCKET_DEG) * HEADING_BUCKET_DEG % 360 if math.isfinite(heading) else None
             except (ValueError, TypeError):
-                plane_style = ""
-            icon_html = f"""
-            <div style='position: relative; width: 32px; height: 32px;'>
-                <span style='display: block; width: 32px; height: 32px; border-radius: 50%; background: #e0e0e0; position: absolute; top: 0; left: 0;'></span>
-                <i class='fa fa-{icon_name}' style='font-size: 20px; color: {icon_color}; position: absolute; top: 6px; left: 6px; {plane_style}'></i>
-            </div>
-            """
-            from folium.features import DivIcon
-            icon = DivIcon(html=icon_html, icon_size=(32, 32), icon_anchor=(16, 16), popup_anchor=(0, -16))
-            folium.Marker(
-                location=[row["latitude"], row["longitude"]],
-                popup=popup_text,
-                icon=icon
-            ).add_to(marker_cluster)
+                heading_bucket = None
+            spec = ("div", icon_name, icon_color, heading_bucket)
         else:
-            folium.Marker(
-                location=[row["latitude"], row["longitude"]],
-                popup=popup_text,
-                icon=folium.Icon(color=icon_color, icon=icon_name, prefix="fa")
-            ).add_to(marker_cluster)
+            spec = ("awesome", icon_name, icon_color)
+        icon_index = icon_specs.setdefault(spec, len(icon_specs))
+        data.append([row.latitude, row.longitude, popup_text, icon_index])
+
+    icons = [
+        ["div", plane_icon_html(*spec[1:])] if spec[0] == "div" else list(spec)
+        for spec in icon_specs
+    ]
+    FastMarkerCluster(data, callback=PLANE_CALLBACK_JS % json.dumps(icons)).add_to(m)
 
     folium.LayerControl().add_to(m)
+    # Auto-refresh goes into the map header so save() writes the final file in one pass
+    refresh_script = f"<script>setTimeout(function(){{window.location.reload();}}, {auto_refresh_seconds * 1000});</script>"
+    m.get_root().header.add_child(folium.Element(refresh_script))
     m.save(filename)
-    # Inject auto-refresh JavaScript
-    try:
-        with open(filename, "r+") as f:
-            html = f.read()
-            refresh_script = f"<script>setTimeout(function(){{window.location.reload();}}, {auto_refresh_seconds * 1000});</script>"
-            if "window.location.reload" not in html:
-                html = html.replace("</head>", refresh_script + "\n</head>")
-                f.seek(0)
-                f.write(html)
-                f.truncate()
-    except Exception as e:
-        print(f"Failed to inject auto-refresh: {e}")
     print(f"✅ Map saved: {filename}")
     # Open map in browser
     import os, webbrowser
@@ -226,7 +269,7 @@ if __name__ == "__main__":
     # Use region filter if specified, otherwise worldwide
     region_names = FILTER_REGION_NAME if FILTER_REGION_NAME else ["worldwide"]
     print(f"📡 Fetching live plane data for: {region_names}")
-    df = fetch_live_planes(region_names=region_names)
+    df = fetch_live_planes(REGION_BBOXES)
     print(df.head())
 
     # Build map in Planes folder with auto-refresh and unit toggle
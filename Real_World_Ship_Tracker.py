@@ -1,15 +1,23 @@
 import asyncio
+import aiohttp
 from playwright.async_api import async_playwright
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import folium
-from folium.plugins import MarkerCluster
+from folium.elements import JSCSSMixin
+from folium.plugins import FastMarkerCluster
+from branca.element import MacroElement
+from jinja2 import Template
 import webbrowser
 import os
-import math
-from folium import DivIcon
 import branca.colormap as cm
-from folium.features import DivIcon
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv  # C++ CSV writer; pandas to_csv is used if missing
+except ImportError:
+    pa = None
 
 # === Tip Jar ===
 "https://www.paypal.com/paypalme/chancevandyke"
@@ -22,6 +30,7 @@ from folium.features import DivIcon
 FILTER_SHIP_TYPE_NAMES = []
 FILTER_REGION_NAME = ["north_america","south_america",]
 ZOOM = 4
+CANVAS_THRESHOLD = 500  # Above this many ships, draw canvas circles instead of clustered icons
 
 # === SHIP TYPE CODES REFERENCE ===
 # "0"  = "Unkown"
@@ -75,6 +84,13 @@ SHIP_TYPE_NAME_TO_CODE = {
 
 SHIP_TYPE_CODE_TO_NAME = {v: k.title() for k, v in SHIP_TYPE_NAME_TO_CODE.items()}
 
+# Resolved once at load; unknown names are dropped
+FILTER_SHIP_CODES = frozenset(
+    SHIP_TYPE_NAME_TO_CODE[name.lower()]
+    for name in FILTER_SHIP_TYPE_NAMES
+    if name.lower() in SHIP_TYPE_NAME_TO_CODE
+)
+
 PREMADE_REGIONS = {
     "worldwide": (-90.0, 90.0, -180.0, 180.0),
     "north_america": (15.0, 72.0, -170.0, -50.0),
@@ -94,22 +110,21 @@ PREMADE_REGIONS = {
     "southern_ocean": (-90.0, -60.0, -180.0, 180.0)
 }
 
-async def fetch_tile_data(z, x, y, page):
+for region in FILTER_REGION_NAME:
+    if region not in PREMADE_REGIONS:
+        print(f"Warning: Region '{region}' not found. Skipping.")
+
+# Selected region bboxes as one (n_regions, 4) array: min_lat, max_lat, min_lon, max_lon
+REGION_BBOX_ARR = np.array(
+    [PREMADE_REGIONS[region] for region in FILTER_REGION_NAME if region in PREMADE_REGIONS],
+    dtype=np.float64,
+).reshape(-1, 4)
+
+async def fetch_tile_data(session, z, x, y):
     url = f"https://www.marinetraffic.com/getData/get_data_json_4/z:{z}/X:{x}/Y:{y}/station:0"
     try:
-        return await page.evaluate(
-            f"""
-            async () => {{
-                const res = await fetch("{url}", {{
-                    method: "GET",
-                    headers: {{
-                        "Referer": "https://www.marinetraffic.com/"
-                    }}
-                }});
-                return await res.json();
-            }}
-            """
-        )
+        async with session.get(url) as res:
+            return await res.json(content_type=None)
     except Exception as e:
         print(f"Error fetching tile {z}/{x}/{y}: {e}")
         return None
@@ -117,61 +132,90 @@ async def fetch_tile_data(z, x, y, page):
 async def fetch_all_tiles():
     z = ZOOM  # Zoom level
     tile_coords = [(z, x, y) for x in range(8) for y in range(8)]  # z=3 has 8x8 tiles
+    user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)"
 
+    # The browser is only needed once to pick up the site's session cookies
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)"
-        )
+        context = await browser.new_context(user_agent=user_agent)
         page = await context.new_page()
 
         await page.goto("https://www.marinetraffic.com/")  # Setup cookies/session
-
-        tasks = [fetch_tile_data(z, x, y, page) for (z, x, y) in tile_coords]
-        results = await asyncio.gather(*tasks)
+        cookies = {c["name"]: c["value"] for c in await context.cookies()}
 
         await browser.close()
 
-        all_rows = []
-        for result in results:
-            if result and isinstance(result, dict):
-                rows = result.get("data", {}).get("rows", [])
-                all_rows.extend(rows)
-        return all_rows
+    # Tiles are plain JSON GETs; fetch them all concurrently over one HTTP session
+    headers = {"Referer": "https://www.marinetraffic.com/", "User-Agent": user_agent}
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(headers=headers, cookies=cookies, timeout=timeout) as session:
+        tasks = [fetch_tile_data(session, z, x, y) for (z, x, y) in tile_coords]
+        results = await asyncio.gather(*tasks)
+    return collect_rows(results)
+
+def collect_rows(results):
+    """Ship rows from the tile responses; adjacent tiles overlap, so keep the first per SHIP_ID."""
+    all_rows = {}
+    for result in results:
+        if result and isinstance(result, dict):
+            for row in (result.get("data") or {}).get("rows") or []:
+                sid = row.get("SHIP_ID")
+                if sid is None or sid in all_rows:
+                    continue
+                all_rows[sid] = row
+    return list(all_rows.values())
+
+# Columns apply_filters and plot_ships_folium read unconditionally
+REQUIRED_COLUMNS = ("SHIP_ID", "LAT", "LON", "SHIPTYPE")
+
+def ships_frame(rows):
+    """DataFrame of fetched ships, or None when the fetch returned no usable rows."""
+    df = pd.DataFrame(rows)
+    # Empty or failed fetches are normal; stop before any column is touched
+    if df.empty or not set(REQUIRED_COLUMNS).issubset(df.columns):
+        return None
+    # collect_rows already dedups; duplicated() is a single mask pass, so keep it as a guard
+    df = df[~df["SHIP_ID"].duplicated(keep="first")].copy()
+    # Few distinct codes across many ships; category lets isin compare codes, not strings
+    df["SHIPTYPE"] = df["SHIPTYPE"].astype("category")
+    return df
 
 
 def apply_filters(df):
+    # Coerce coordinates once here; plot_ships_folium relies on them being numeric
+    df["LAT"] = pd.to_numeric(df["LAT"], errors="coerce")
+    df["LON"] = pd.to_numeric(df["LON"], errors="coerce")
+
+    # Nothing to filter (common for ad-hoc runs)
+    if not FILTER_SHIP_TYPE_NAMES and not FILTER_REGION_NAME:
+        return df
+
     # Ship type filtering
     if FILTER_SHIP_TYPE_NAMES:
-        filter_names_lower = [name.lower() for name in FILTER_SHIP_TYPE_NAMES]
-        filter_codes = [
-            SHIP_TYPE_NAME_TO_CODE[name]
-            for name in filter_names_lower
-            if name in SHIP_TYPE_NAME_TO_CODE
-        ]
-        if not filter_codes:
+        if not FILTER_SHIP_CODES:
             print("Warning: No matching ship type codes found. Skipping ship type filter.")
         else:
-            df = df[df["SHIPTYPE"].isin(filter_codes)]
+            df = df[df["SHIPTYPE"].isin(FILTER_SHIP_CODES)]
 
     # Region filtering
     if FILTER_REGION_NAME:
-        df["LAT"] = pd.to_numeric(df["LAT"], errors="coerce")
-        df["LON"] = pd.to_numeric(df["LON"], errors="coerce")
-        region_filtered = pd.DataFrame()
-        for region in FILTER_REGION_NAME:
-            if region not in PREMADE_REGIONS:
-                print(f"Warning: Region '{region}' not found. Skipping.")
-                continue
-            min_lat, max_lat, min_lon, max_lon = PREMADE_REGIONS[region]
-            region_df = df[
-                (df["LAT"] >= min_lat) & (df["LAT"] <= max_lat) &
-                (df["LON"] >= min_lon) & (df["LON"] <= max_lon)
-            ]
-            region_filtered = pd.concat([region_filtered, region_df])
-        df = region_filtered
+        lat = df["LAT"].to_numpy()[:, None]
+        lon = df["LON"].to_numpy()[:, None]
+        min_lat, max_lat, min_lon, max_lon = REGION_BBOX_ARR.T
+        # Ships x regions in one broadcast; a ship in overlapping regions is kept once
+        mask = ((lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)).any(axis=1)
+        df = df[mask]
     return df
 
+def write_csv(df, filename):
+    if pa is not None:
+        try:
+            pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), filename)
+            return
+        except pa.ArrowException:
+            pass  # e.g. a column mixing ints and strings; let pandas stringify it
+    df.to_csv(filename, index=False)
+
 def save_ships_table(df, filename="ships_table.csv"):
     df = df.copy()
 
@@ -190,82 +234,117 @@ def save_ships_table(df, filename="ships_table.csv"):
     df = df[cols_sorted]
 
     # Save to CSV
-    df.to_csv(filename, index=False)
+    write_csv(df, filename)
     print(f"Saved ships data table to {filename}")
 
-def plot_ships_folium(df):
+# markerClusterGroup options: add markers in animation-frame chunks so the page stays
+# responsive, and stop clustering once zoomed in close enough to tell ships apart
+CLUSTER_OPTIONS = {
+    "chunkedLoading": True,
+    "chunkInterval": 200,
+    "chunkDelay": 50,
+    "maxClusterRadius": 60,
+    "disableClusteringAtZoom": 8,
+    "removeOutsideVisibleBounds": True,
+}
+
+ROTATED_MARKER_JS = "https://cdn.jsdelivr.net/npm/leaflet-rotatedmarker@0.2.0/leaflet.rotatedMarker.min.js"
+
+class RotatedMarkerPlugin(JSCSSMixin, MacroElement):
+    """Loads Leaflet.RotatedMarker; added to the map so folium links it after leaflet.js."""
+    _template = Template("")
+    default_js = [("leaflet.rotatedMarker", ROTATED_MARKER_JS)]
+
+# FastMarkerCluster callback: one SVG hull per ship, rotated to its heading by
+# Leaflet.RotatedMarker. Icons are built once per color and shared between markers.
+SHIP_CALLBACK_JS = """
+(function () {
+    var svg = '<svg xmlns="http://www.w3.org/2000/svg" width="16" height="24" viewBox="0 0 16 24">' +
+              '<path d="M8 1 L15 9 L15 23 L1 23 L1 9 Z" fill="COLOR" stroke="black" stroke-width="1"/></svg>';
+    var icons = {};
+    return function (row) {
+        var color = row[3];
+        if (!icons[color]) {
+            icons[color] = L.icon({
+                iconUrl: "data:image/svg+xml;charset=utf-8," + encodeURIComponent(svg.replace("COLOR", color)),
+                iconSize: [16, 24],
+                iconAnchor: [8, 12],  // center anchor so it rotates in place
+                popupAnchor: [0, -12]
+            });
+        }
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {
+            icon: icons[color],
+            rotationAngle: row[4] === null ? 0 : row[4],
+            rotationOrigin: "center center"
+        });
+        marker.bindPopup(row[2]);
+        return marker;
+    };
+})()
+"""
+
+def build_ships_map(df):
+    """folium.Map of the ships in df, or None when there is nothing to plot."""
     if df.empty:
         print("No ships to plot. Skipping map rendering.")
-        return
+        return None
 
-    df = df.copy()
-    df["LAT"] = pd.to_numeric(df["LAT"], errors="coerce")
-    df["LON"] = pd.to_numeric(df["LON"], errors="coerce")
-    df = df.dropna(subset=["LAT", "LON", "SHIPTYPE"])
+    df = df.dropna(subset=["LAT", "LON", "SHIPTYPE"]).copy()
 
-    # Map ship type code to readable names
-    df["SHIPTYPE_NAME"] = df["SHIPTYPE"].map(SHIP_TYPE_CODE_TO_NAME).fillna("Unknown")
+    # Map ship type code to readable names: look up each category once, then take by code
+    shiptype = pd.Categorical(df["SHIPTYPE"])
+    names = np.array([SHIP_TYPE_CODE_TO_NAME.get(code, "Unknown") for code in shiptype.categories], dtype=object)
+    df["SHIPTYPE_NAME"] = names[shiptype.codes]
 
     # Create folium map centered on mean coords
-    center_lat = df["LAT"].mean()
-    center_lon = df["LON"].mean()
-    m = folium.Map(location=[center_lat, center_lon], zoom_start=4, tiles="OpenStreetMap")
+    center_lat = np.nanmean(df["LAT"].to_numpy())
+    center_lon = np.nanmean(df["LON"].to_numpy())
+    use_canvas = len(df) > CANVAS_THRESHOLD
+    m = folium.Map(location=[center_lat, center_lon], zoom_start=4, tiles="OpenStreetMap", prefer_canvas=use_canvas)
 
     # Create color palette for ship types
     ship_types = df["SHIPTYPE_NAME"].unique()
     palette = cm.linear.Set1_09.scale(0, len(ship_types) - 1)
     color_dict = {stype: palette(i) for i, stype in enumerate(ship_types)}
 
-    # Add marker cluster
-    marker_cluster = MarkerCluster().add_to(m)
-
-    for _, row in df.iterrows():
-        lat, lon = row["LAT"], row["LON"]
-        ship_name = row.get("SHIPNAME", "Unknown")
-        ship_type_name = row.get("SHIPTYPE_NAME", "Unknown")
-        destination = row.get("DESTINATION", "Unknown")
-        heading = row.get("HEADING")
-
-        popup_html = f"""
-            <b>{ship_name}</b><br>
-            Type: {ship_type_name}<br>
-            Destination: {destination}
-        """
+    # Popup, icon color and heading as whole columns; the browser builds the icons from
+    # one [lat, lon, popup, color, heading] array instead of a folium Marker per ship
+    unknown = pd.Series("Unknown", index=df.index)
+    ship_name = df["SHIPNAME"].fillna("Unknown").astype(str) if "SHIPNAME" in df else unknown
+    destination = df["DESTINATION"].fillna("Unknown").astype(str) if "DESTINATION" in df else unknown
+    # Get boat color from ship type
+    boat_colors = df["SHIPTYPE_NAME"].map(color_dict).fillna("blue")  # fallback blue if unknown
+
+    if use_canvas:
+        # Large fleets: one GeoJson layer of circles painted on a single <canvas>
+        # rather than thousands of DOM icons (heading arrows are dropped here)
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {"SHIPNAME": name, "SHIPTYPE_NAME": stype, "DESTINATION": dest, "color": color},
+            }
+            for lat, lon, name, stype, dest, color in zip(
+                df["LAT"], df["LON"], ship_name, df["SHIPTYPE_NAME"], destination, boat_colors
+            )
+        ]
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": features},
+            marker=folium.CircleMarker(radius=4, weight=1, fill=True, fill_opacity=0.8),
+            style_function=lambda f: {"color": f["properties"]["color"], "fillColor": f["properties"]["color"]},
+            popup=folium.GeoJsonPopup(fields=["SHIPNAME", "SHIPTYPE_NAME", "DESTINATION"], aliases=["Ship", "Type", "Destination"]),
+        ).add_to(m)
+    else:
+        popups = "<b>" + ship_name + "</b><br>Type: " + df["SHIPTYPE_NAME"] + "<br>Destination: " + destination
+        # Heading drives the icon rotation; missing/invalid (AIS uses 511) -> null (unrotated)
+        headings = pd.to_numeric(df["HEADING"], errors="coerce") if "HEADING" in df else pd.Series(float("nan"), index=df.index)
+        headings = headings.where(headings < 360)
+        headings = headings.astype(object).where(headings.notna(), None)
 
-        # Get boat color from ship type
-        boat_color = color_dict.get(ship_type_name, "blue")  # fallback blue if unknown
-
-        # Prepare arrow rotation CSS if heading is valid
-        arrow_style = ""
-        try:
-            h = float(heading)
-            if not math.isnan(h):
-                arrow_style = f"transform: rotate({h}deg);"
-        except (ValueError, TypeError):
-            arrow_style = ""
-
-        # Compose combined icon HTML: colored boat + black arrow
-        icon_html = f"""
-        <div style="position: relative; width: 32px; height: 32px;">
-            <!-- Boat icon with ship type color -->
-            <i class="fas fa-ship" style="font-size: 24px; color: {boat_color}; position: absolute; top: 4px; left: 4px;"></i>
-            <!-- Black arrow icon, rotated and positioned -->
-            {'<i class="fa fa-arrow-up" style="color: black; font-size: 12px; position: absolute; top: 0; left: 12px; ' + arrow_style + '"></i>' if arrow_style else ''}
-        </div>
-        """
-
-        icon = DivIcon(
-            html=icon_html,
-            icon_size=(32, 32),
-            icon_anchor=(16, 16),  # center anchor so it points correctly
-            popup_anchor=(0, -16)
-        )
-
-        folium.Marker(
-            location=(lat, lon),
-            popup=popup_html,
-            icon=icon,
-        ).add_to(marker_cluster)
+        # A plain header link would land ahead of leaflet.js and fail with L undefined
+        RotatedMarkerPlugin().add_to(m)
+        data = [list(row) for row in zip(df["LAT"], df["LON"], popups, boat_colors, headings)]
+        FastMarkerCluster(data, callback=SHIP_CALLBACK_JS, options=CLUSTER_OPTIONS).add_to(m)
 
     # Add legend
     legend_html = '<div style="position: fixed; bottom: 50px; left: 50px; width: 150px; background-color: white; border:2px solid grey; z-index:9999; font-size:14px;">'
@@ -274,6 +353,12 @@ def plot_ships_folium(df):
         legend_html += f'<i style="background:{color};width:15px;height:15px;float:left;margin-right:5px;"></i>{stype}<br>'
     legend_html += '</div>'
     m.get_root().html.add_child(folium.Element(legend_html))
+    return m
+
+def plot_ships_folium(df):
+    m = build_ships_map(df)
+    if m is None:
+        return
 
     map_filename = "ships_map.html"
     m.save(map_filename)
@@ -284,18 +369,20 @@ def plot_ships_folium(df):
 
 if __name__ == "__main__":
     ships = asyncio.run(fetch_all_tiles())
-    df = pd.DataFrame(ships).drop_duplicates(subset=["SHIP_ID"])
-
-    # print("Unique SHIPTYPE codes in dataset:", df["SHIPTYPE"].dropna().unique())
-    print(f"Total boats fetched: {len(df)}")
+    df = ships_frame(ships)
+    if df is None:
+        print("No ships fetched (empty or failed tile responses). Nothing to save or plot.")
+    else:
+        # print("Unique SHIPTYPE codes in dataset:", df["SHIPTYPE"].dropna().unique())
+        print(f"Total boats fetched: {len(df)}")
 
-    df_filtered = apply_filters(df)
+        df_filtered = apply_filters(df)
 
-    print(f"Boats after filtering: {len(df_filtered)}")
-    print(df_filtered.head())
+        print(f"Boats after filtering: {len(df_filtered)}")
+        print(df_filtered.head())
 
-    df_filtered.to_csv("filtered_ships_data.csv", index=False)
-    print("Saved filtered_ships_data.csv with filtered boats.")
+        write_csv(df_filtered, "filtered_ships_data.csv")
+        print("Saved filtered_ships_data.csv with filtered boats.")
 
-    save_ships_table(df_filtered, filename="ships_table.csv")
-    plot_ships_folium(df_filtered)
+        save_ships_table(df_filtered, filename="ships_table.csv")
+        plot_ships_folium(df_filtered)
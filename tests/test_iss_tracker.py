@@ -0,0 +1,42 @@
+import os
+import sys
+from collections import deque
+
+import pytest
+
+pytest.importorskip("folium")
+pytest.importorskip("requests")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ISS_tracker as iss
+
+
+def render(m, base):
+    iss.prune_rendered(m, base)
+    return m.get_root().render()
+
+
+def test_rerender_keeps_one_copy_of_each_marker():
+    m, base = iss.new_map((10.0, 20.0))
+    history = deque(maxlen=10)
+    current = iss.add_fix(m, history, None, (10.0, 20.0), "pt_0")
+    render(m, base)
+    current = iss.add_fix(m, history, current, (11.0, 21.0), "pt_1")
+    html = render(m, base)
+    assert html.count("L.circleMarker(") == 1
+    assert html.count("L.marker(") == 1
+
+
+def test_page_holds_only_the_rolling_window():
+    window_size = 3
+    m, base = iss.new_map((0.0, 0.0))
+    history = deque(maxlen=window_size - 1)
+    current = None
+    for i in range(5):
+        current = iss.add_fix(m, history, current, (float(i), float(i)), f"pt_{i}")
+        html = render(m, base)
+    assert html.count("L.circleMarker(") == window_size - 1
+    assert html.count("L.marker(") == 1
+    # Oldest fixes were evicted; the two before the current one remain
+    assert "Lat: 0.0, Lon: 0.0" not in html
+    assert "Lat: 3.0, Lon: 3.0" in html
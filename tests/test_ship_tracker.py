@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+for _mod in ("numpy", "pandas", "geopandas", "folium", "aiohttp", "playwright"):
+    pytest.importorskip(_mod)
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Real_World_Ship_Tracker as ship
+
+
+def test_rotated_marker_script_loads_after_leaflet():
+    df = pd.DataFrame({
+        "LAT": [30.0, 31.0],
+        "LON": [-80.0, -81.0],
+        "SHIPTYPE": ["1", "2"],
+        "SHIPNAME": ["Alpha", "Bravo"],
+        "HEADING": [90, 511],
+    })
+    html = ship.build_ships_map(df).get_root().render()
+    plugin = html.index(f'<script src="{ship.ROTATED_MARKER_JS}"')
+    leaflet = html.index("/leaflet.js")
+    assert leaflet < plugin
+
+
+@pytest.mark.parametrize("response", [
+    {"type": 1, "data": {"rows": [], "areaShips": 0}},
+    {"data": {}},
+    None,  # fetch_tile_data returns None on a failed request
+])
+def test_empty_tile_response_yields_no_frame(response):
+    rows = ship.collect_rows([response])
+    assert rows == []
+    assert ship.ships_frame(rows) is None
+
+
+def test_rows_missing_columns_yield_no_frame():
+    assert ship.ships_frame([{"SHIP_ID": "1", "LAT": "30.0"}]) is None
+
+
+def test_ships_frame_dedups_and_categorises():
+    rows = [
+        {"SHIP_ID": "1", "LAT": "30.0", "LON": "-80.0", "SHIPTYPE": "1"},
+        {"SHIP_ID": "1", "LAT": "30.5", "LON": "-80.5", "SHIPTYPE": "1"},
+        {"SHIP_ID": "2", "LAT": "31.0", "LON": "-81.0", "SHIPTYPE": "2"},
+    ]
+    df = ship.ships_frame(rows)
+    assert list(df["SHIP_ID"]) == ["1", "2"]
+    assert isinstance(df["SHIPTYPE"].dtype, pd.CategoricalDtype)
@@ -1,8 +1,15 @@
+import os
+import re
+import json
 import folium
 import requests
+import numpy as np
 import pandas as pd
 from folium.plugins import MarkerCluster
-import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from functools import lru_cache
 from metar import Metar
 
 # =====================
@@ -10,9 +17,13 @@ from metar import Metar
 # =====================
 FILTER_REGION_NAME = ["north_america"]  # e.g. ["europe"] or [] for worldwide
 MAP_FILENAME = "Weather/weather_map.html"
+DATA_FILENAME = "Weather/weather_data.js"  # Rewritten each refresh; the map page polls it
+METAR_CACHE_FILENAME = "Weather/metar_cache.feather"  # Parsed reports kept across runs (needs pyarrow)
+METAR_CACHE_MAX = 4096  # Most recent (station, issue time) entries to keep
 AUTO_REFRESH_SECONDS = 120
 MAP_ZOOM = 5
 MAX_RUNTIME_HOURS = 12  # Failsafe to stop after N hours of continuous updates
+MAX_WORKERS = 16  # Concurrent NOAA requests per refresh
 
 # Premade region bounding boxes
 PREMADE_REGIONS = {
@@ -98,6 +109,10 @@ GLOBAL_AIRPORTS = [
     {"name": "OEJN", "city": "Jeddah", "lat": 21.4817, "lon": 39.5443},
 ]
 
+# Airport coordinates as arrays so region lookups are vectorized bbox masks
+_AP_LAT = np.fromiter((a["lat"] for a in GLOBAL_AIRPORTS), float, count=len(GLOBAL_AIRPORTS))
+_AP_LON = np.fromiter((a["lon"] for a in GLOBAL_AIRPORTS), float, count=len(GLOBAL_AIRPORTS))
+
 def c_to_f(c):
     try:
         return round((c * 9/5) + 32, 1)
@@ -116,138 +131,264 @@ def km_to_mi(km):
     except:
         return "N/A"
 
+# One keep-alive pool for every tgftp request; sized to the worker count
+SESSION = requests.Session()
+retry_strategy = Retry(
+    total=3,
+    backoff_factor=0.3,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["GET"],
+)
+adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+SESSION.mount("https://", adapter)
+SESSION.mount("http://", adapter)
+SESSION.headers.update({"Accept-Encoding": "gzip"})
+
+# Last response per station as (Last-Modified, body) for conditional GETs
+LAST_METAR = {}
+
+@lru_cache(maxsize=4096)
+def _parse_metar(raw):
+    """Parse a raw METAR into (temp_f, wind, vis_mi, wx, precip); memoized since reports change ~hourly."""
+    if raw == "N/A":
+        return ("N/A",) * 5
+    # Use python-metar for robust parsing
+    try:
+        report = Metar.Metar(raw)
+        temp_c = report.temp.value() if report.temp else None
+        temp_f = c_to_f(temp_c) if temp_c is not None else "N/A"
+        wind_kt = report.wind_speed.value() if report.wind_speed else None
+        wind_mph = kt_to_mph(wind_kt) if wind_kt is not None else "N/A"
+        wind_dir = report.wind_dir.value() if report.wind_dir else "N/A"
+        wind = f"{wind_mph} mph @ {wind_dir}°" if wind_mph != "N/A" and wind_dir != "N/A" else "N/A"
+        vis_km = report.vis.value() if report.vis else None
+        vis_mi = km_to_mi(vis_km) if vis_km is not None else "N/A"
+        wx = ", ".join([w for w in report.weather]) if report.weather else "N/A"
+        if hasattr(report, 'precip') and report.precip:
+            precip = ", ".join([str(p) for p in report.precip])
+        else:
+            precip = "N/A"
+        return temp_f, wind, vis_mi, wx, precip
+    except Exception:
+        return ("N/A",) * 5
+
+# Parsed fields per (station, issue time), oldest first; persisted to METAR_CACHE_FILENAME
+METAR_HISTORY = {}
+HISTORY_FIELDS = ["temperature", "wind", "visibility", "wx", "precip"]
+
+def metar_issue_time(raw):
+    """DDHHMMZ group of a raw METAR, or None if it can't be found."""
+    for token in raw.split()[1:3]:
+        if len(token) == 7 and token.endswith("Z") and token[:6].isdigit():
+            return token
+    return None
+
+def load_metar_history(filename=METAR_CACHE_FILENAME):
+    try:
+        cache_df = pd.read_feather(filename)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print(f"Could not load METAR cache: {e}")
+        return
+    for row in cache_df.itertuples(index=False):
+        METAR_HISTORY[(row.station, row.issue_time)] = tuple(getattr(row, f) for f in HISTORY_FIELDS)
+    print(f"Loaded {len(METAR_HISTORY)} cached METAR reports")
+
+def save_metar_history(filename=METAR_CACHE_FILENAME):
+    # Ring buffer: drop the oldest entries past the cap
+    for key in list(METAR_HISTORY)[:max(0, len(METAR_HISTORY) - METAR_CACHE_MAX)]:
+        del METAR_HISTORY[key]
+    rows = [
+        # Stored as strings so mixed float/"N/A" values fit one Arrow column
+        dict(station=station, issue_time=issue, **{f: str(v) for f, v in zip(HISTORY_FIELDS, parsed)})
+        for (station, issue), parsed in METAR_HISTORY.items()
+    ]
+    try:
+        tmp = f"{filename}.{os.getpid()}.tmp"
+        pd.DataFrame(rows, columns=["station", "issue_time"] + HISTORY_FIELDS).to_feather(tmp)
+        os.replace(tmp, filename)
+    except Exception as e:
+        print(f"Could not save METAR cache: {e}")
+
+def fetch_metar_one(airport):
+    """Fetch and parse the latest METAR for one airport (runs in a worker thread)."""
+    url = f"https://tgftp.nws.noaa.gov/data/observations/metar/stations/{airport['name']}.TXT"
+    try:
+        cached = LAST_METAR.get(airport["name"])
+        headers = {"If-Modified-Since": cached[0]} if cached else {}
+        resp = SESSION.get(url, headers=headers, timeout=(3, 5))
+        if resp.status_code == 304 and cached:
+            # Report unchanged since last refresh; reuse the previous body
+            text = cached[1]
+        else:
+            text = resp.text
+            last_modified = resp.headers.get("Last-Modified")
+            if resp.ok and last_modified:
+                LAST_METAR[airport["name"]] = (last_modified, text)
+        # One print per airport so concurrent responses don't interleave
+        print(f"\n{airport['name']} NOAA response:\n{text}")
+        lines = text.splitlines()
+        raw = lines[-1] if len(lines) > 1 else "N/A"
+        # Reports already parsed this run or a previous one are reused by issue time
+        key = (airport["name"], metar_issue_time(raw))
+        parsed = METAR_HISTORY.get(key)
+        if parsed is None:
+            parsed = _parse_metar(raw)
+            if key[1] is not None:
+                METAR_HISTORY[key] = parsed
+        temp_f, wind, vis_mi, wx, precip = parsed
+        return {
+            "name": airport["name"],
+            "city": airport["city"],
+            "lat": airport["lat"],
+            "lon": airport["lon"],
+            "raw": raw,
+            "temperature": temp_f,
+            "wind": wind,
+            "visibility": vis_mi,
+            "wx": wx,
+            "precip": precip,
+        }
+    except Exception as e:
+        return {
+            "name": airport["name"],
+            "city": airport["city"],
+            "lat": airport["lat"],
+            "lon": airport["lon"],
+            "raw": "N/A",
+            "temperature": "N/A",
+            "wind": "N/A",
+            "visibility": "N/A",
+            "wx": "N/A",
+            "precip": "N/A",
+        }
+
 def fetch_metar_noaa(airports):
-    records = []
-    for airport in airports:
-        url = f"https://tgftp.nws.noaa.gov/data/observations/metar/stations/{airport['name']}.TXT"
-        try:
-            resp = requests.get(url)
-            print(f"\n{airport['name']} NOAA response:")
-            print(resp.text)
-            lines = resp.text.splitlines()
-            raw = lines[-1] if len(lines) > 1 else "N/A"
-            # Use python-metar for robust parsing
-            try:
-                if raw != "N/A":
-                    report = Metar.Metar(raw)
-                    temp_c = report.temp.value() if report.temp else None
-                    temp_f = c_to_f(temp_c) if temp_c is not None else "N/A"
-                    wind_kt = report.wind_speed.value() if report.wind_speed else None
-                    wind_mph = kt_to_mph(wind_kt) if wind_kt is not None else "N/A"
-                    wind_dir = report.wind_dir.value() if report.wind_dir else "N/A"
-                    wind = f"{wind_mph} mph @ {wind_dir}°" if wind_mph != "N/A" and wind_dir != "N/A" else "N/A"
-                    vis_km = report.vis.value() if report.vis else None
-                    vis_mi = km_to_mi(vis_km) if vis_km is not None else "N/A"
-                    wx = ", ".join([w for w in report.weather]) if report.weather else "N/A"
-                    precip = None
-                    if hasattr(report, 'precip') and report.precip:
-                        precip = ", ".join([str(p) for p in report.precip])
-                    else:
-                        precip = "N/A"
-                else:
-                    temp_f = wind = vis_mi = wx = precip = "N/A"
-            except Exception as e:
-                temp_f = wind = vis_mi = wx = precip = "N/A"
-            records.append({
-                "name": airport["name"],
-                "city": airport["city"],
-                "lat": airport["lat"],
-                "lon": airport["lon"],
-                "raw": raw,
-                "temperature": temp_f,
-                "wind": wind,
-                "visibility": vis_mi,
-                "wx": wx,
-                "precip": precip,
-            })
-        except Exception as e:
-            records.append({
-                "name": airport["name"],
-                "city": airport["city"],
-                "lat": airport["lat"],
-                "lon": airport["lon"],
-                "raw": "N/A",
-                "temperature": "N/A",
-                "wind": "N/A",
-                "visibility": "N/A",
-                "wx": "N/A",
-                "precip": "N/A",
-            })
-        time.sleep(0.2)  # Faster, but still cautious for rate limits
+    # Every airport is an independent GET; MAX_WORKERS bounds how many hit NOAA at once
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        records = list(ex.map(fetch_metar_one, airports))
     return pd.DataFrame(records)
 
-def make_map(df, filename=MAP_FILENAME, auto_refresh_seconds=AUTO_REFRESH_SECONDS, zoom_start=MAP_ZOOM, open_browser=False):
+# markerClusterGroup options: chunked addLayers keeps each refresh swap off the critical
+# path, and clustering stops at city-level zoom
+CLUSTER_OPTIONS = {
+    "chunkedLoading": True,
+    "chunkInterval": 200,
+    "chunkDelay": 50,
+    "maxClusterRadius": 60,
+    "disableClusteringAtZoom": 8,
+    "removeOutsideVisibleBounds": True,
+}
+
+# Precipitation codes anywhere in the wx string; no word boundaries, so TSRA, SHRA,
+# FZRA and -SN still match
+_PRECIP_RE = re.compile(r"RA|SN|DZ|SG|PL|GR|GS|IC")
+
+# Client side of the map: reload DATA_FILENAME through a <script> tag (fetch() is blocked
+# on file:// pages) and swap the cluster's markers in place, no page reload. Polling
+# starts on window load, after folium's own script has created the cluster.
+WEATHER_UPDATE_JS = """
+function updateWeather(rows) {
+    var markers = rows.map(function (r) {
+        var icon = L.AwesomeMarkers.icon({icon: r.icon, prefix: "fa", markerColor: r.color, iconColor: "white"});
+        return L.marker([r.lat, r.lon], {icon: icon}).bindPopup(r.popup);
+    });
+    %(cluster)s.clearLayers();
+    %(cluster)s.addLayers(markers);
+}
+function loadWeather() {
+    var s = document.createElement("script");
+    s.src = "%(src)s?t=" + Date.now();
+    s.onload = s.onerror = function () { s.remove(); };
+    document.body.appendChild(s);
+}
+window.addEventListener("load", function () {
+    loadWeather();
+    setInterval(loadWeather, %(ms)d);
+});
+"""
+
+def weather_records(df):
+    """Marker rows (lat, lon, icon, color, popup) for the client-side update script."""
+    # Check for precipitation in weather codes or precip field, for every row at once
+    precip = df["precip"].fillna("").astype(str).str.strip()
+    has_precip = (df["wx"].fillna("").astype(str).str.contains(_PRECIP_RE) | ((precip != "") & (precip != "N/A"))).to_numpy()
+
+    # Popup HTML assembled column-wise rather than one f-string per airport
+    col = lambda c: df[c].astype(str)
+    popups = (
+        "<div style='font-family: Arial, sans-serif; font-size: 13px; min-width: 200px;'>"
+        "<table style='width:100%; border-collapse:collapse;'>"
+        "<tr><th colspan='2' style='background:#4FC3F7; color:#fff; padding:4px; border-radius:4px 4px 0 0;'>"
+        + col("name") + " - " + col("city") + "</th></tr>"
+        "<tr><td><b>Temperature</b></td><td>" + col("temperature") + " °F</td></tr>"
+        "<tr><td><b>Wind</b></td><td>" + col("wind") + "</td></tr>"
+        "<tr><td><b>Visibility</b></td><td>" + col("visibility") + " mi</td></tr>"
+        "<tr><td><b>Weather</b></td><td>" + col("wx") + "</td></tr>"
+        "<tr><td><b>Precipitation</b></td><td>" + col("precip") + "</td></tr>"
+        "<tr><td colspan='2'><small>Raw METAR: " + col("raw") + "</small></td></tr>"
+        "</table></div>"
+    )
+    return pd.DataFrame({
+        "lat": df["lat"],
+        "lon": df["lon"],
+        # stormy cloud (FontAwesome) when there's precipitation
+        "icon": np.where(has_precip, "cloud-showers-heavy", "cloud"),
+        "color": np.where(has_precip, "darkpurple", "blue"),
+        "popup": popups,
+    }).to_dict(orient="records")
+
+def write_weather_data(df, filename=DATA_FILENAME):
+    """Write the marker data the open map polls; atomic so a poll never reads half a file."""
+    payload = json.dumps(weather_records(df), ensure_ascii=False)
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(f"updateWeather({payload});\n")
+    os.replace(tmp, filename)
+    print(f"✅ Weather data saved: {filename}")
+
+def make_map(df, filename=MAP_FILENAME, data_filename=DATA_FILENAME, auto_refresh_seconds=AUTO_REFRESH_SECONDS, zoom_start=MAP_ZOOM, open_browser=False):
+    """Write the data file and the map page; later refreshes only need write_weather_data."""
+    write_weather_data(df, data_filename)
+
     center_lat = df["lat"].mean()
     center_lon = df["lon"].mean()
     m = folium.Map(location=[center_lat, center_lon], zoom_start=zoom_start)
-    marker_cluster = MarkerCluster().add_to(m)
-
-    for _, row in df.iterrows():
-        # Check for precipitation in weather codes or precip field
-        precip_keywords = ["RA", "SN", "DZ", "SG", "PL", "GR", "GS", "IC"]
-        wx_precip = any(code in str(row.get('wx', "")) for code in precip_keywords)
-        has_precip = (row.get('precip') and row['precip'] != "N/A" and row['precip'].strip() != "") or wx_precip
-        if has_precip:
-            icon_name = "cloud-showers-heavy"  # stormy cloud (FontAwesome)
-            icon_color = "darkpurple"
-        else:
-            icon_name = "cloud"
-            icon_color = "blue"
-        popup_text = f"""
-        <div style='font-family: Arial, sans-serif; font-size: 13px; min-width: 200px;'>
-            <table style='width:100%; border-collapse:collapse;'>
-                <tr><th colspan='2' style='background:#4FC3F7; color:#fff; padding:4px; border-radius:4px 4px 0 0;'>{row['name']} - {row['city']}</th></tr>
-                <tr><td><b>Temperature</b></td><td>{row['temperature']} °F</td></tr>
-                <tr><td><b>Wind</b></td><td>{row['wind']}</td></tr>
-                <tr><td><b>Visibility</b></td><td>{row['visibility']} mi</td></tr>
-                <tr><td><b>Weather</b></td><td>{row['wx']}</td></tr>
-                <tr><td><b>Precipitation</b></td><td>{row['precip']}</td></tr>
-                <tr><td colspan='2'><small>Raw METAR: {row['raw']}</small></td></tr>
-            </table>
-        </div>
-        """
-        folium.Marker(
-            location=[row["lat"], row["lon"]],
-            popup=popup_text,
-            icon=folium.Icon(color=icon_color, icon=icon_name, prefix="fa")
-        ).add_to(marker_cluster)
+    # Starts empty; markers arrive from the data file
+    marker_cluster = MarkerCluster(options=CLUSTER_OPTIONS).add_to(m)
 
     folium.LayerControl().add_to(m)
+    src = os.path.relpath(data_filename, os.path.dirname(filename) or ".").replace(os.sep, "/")
+    m.get_root().script.add_child(folium.Element(WEATHER_UPDATE_JS % {
+        "cluster": marker_cluster.get_name(),
+        "src": src,
+        "ms": auto_refresh_seconds * 1000,
+    }))
     m.save(filename)
-    # Inject auto-refresh JavaScript
-    try:
-        with open(filename, "r+") as f:
-            html = f.read()
-            refresh_script = f"<script>setTimeout(function(){{window.location.reload();}}, {auto_refresh_seconds * 1000});</script>"
-            if "window.location.reload" not in html:
-                html = html.replace("</head>", refresh_script + "\n</head>")
-                f.seek(0)
-                f.write(html)
-                f.truncate()
-    except Exception as e:
-        print(f"Failed to inject auto-refresh: {e}")
     print(f"✅ Map saved: {filename}")
     if open_browser:
-        import os, webbrowser
+        import webbrowser
         full_path = os.path.abspath(filename)
         webbrowser.open(f"file://{full_path}")
     return filename
 
 def get_airports_by_region(region_names):
-    airports = []
     if not region_names:
         region_names = ["worldwide"]
+    # OR the region masks together so an airport in overlapping regions is listed once
+    mask = np.zeros(len(GLOBAL_AIRPORTS), dtype=bool)
     for region in region_names:
         bbox = PREMADE_REGIONS.get(region, PREMADE_REGIONS["worldwide"])
         min_lat, max_lat, min_lon, max_lon = bbox
-        region_airports = [a for a in GLOBAL_AIRPORTS if min_lat <= a["lat"] <= max_lat and min_lon <= a["lon"] <= max_lon]
-        airports.extend(region_airports)
-    return airports
+        mask |= (_AP_LAT >= min_lat) & (_AP_LAT <= max_lat) & (_AP_LON >= min_lon) & (_AP_LON <= max_lon)
+    return [GLOBAL_AIRPORTS[i] for i in np.flatnonzero(mask)]
 
 if __name__ == "__main__":
     import time as _time
     opened = False
     start = _time.monotonic()
+    load_metar_history()
     max_seconds = MAX_RUNTIME_HOURS * 3600 if MAX_RUNTIME_HOURS and MAX_RUNTIME_HOURS > 0 else None
     try:
         while True:
@@ -255,8 +396,13 @@ if __name__ == "__main__":
             airports = get_airports_by_region(FILTER_REGION_NAME)
             df = fetch_metar_noaa(airports)
             print(df.head())
-            make_map(df, open_browser=not opened)
-            opened = True
+            if not opened:
+                make_map(df, open_browser=True)
+                opened = True
+            else:
+                # Page skeleton is already open; it picks up the new data on its next poll
+                write_weather_data(df)
+            save_metar_history()
 
             if max_seconds is not None and (_time.monotonic() - start) >= max_seconds:
                 print(f"Max runtime reached ({MAX_RUNTIME_HOURS}h). Exiting.")
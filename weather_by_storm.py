@@ -1,13 +1,39 @@
+import io
 import os
+import gzip
+import shutil
+import http.server
+import re
 import csv
+import json
+import time
+import shelve
+import threading
 import folium
 import requests
-from datetime import datetime, timezone
-from math import cos, radians, sqrt, pi
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from branca.element import MacroElement
+from jinja2 import Template
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone, timedelta
+from math import pi
+from bisect import bisect_right
+from functools import lru_cache
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, Future, wait
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+try:
+    import orjson  # much faster JSON decode; stdlib json is used if missing
+except ImportError:
+    orjson = None
+
+try:
+    import ijson  # streaming JSON parser for the large NWS alerts document
+except ImportError:
+    ijson = None
+
 # =====================
 # CONFIGURABLE SETTINGS
 # =====================
@@ -19,12 +45,15 @@ MAP_FILENAME = os.path.join(OUTPUT_DIR, "weather_events_map.html")
 MAP_ZOOM = 3
 RADAR_OPACITY = 0.7  # 0..1
 STORM_RADIUS_KM = 200  # approximate impact radius for tropical cyclones
+FIRMS_GRID_DEG = 0.05  # Fire detections within one grid cell are drawn as a single circle
 REFRESH_SECONDS = 120
 MAX_RUNTIME_HOURS = 12  # Failsafe to stop after N hours
+SERVE_PORT = 8765  # Local HTTP server for the map page; 0 or a busy port falls back to file://
+FULL_REBUILD_SECONDS = 600  # Rebuild the full map at least this often even if no feed changed
 
 # Timeouts and concurrency
 TIMEOUT = 12
-MAX_WORKERS = 6
+MAX_WORKERS = 12  # Every feed is fetched at once at the start of build_map (13 GETs)
 
 # Shared session with gentle retries and larger pool
 SESSION = requests.Session()
@@ -43,16 +72,189 @@ SESSION.headers.update({
     "Accept": "application/geo+json"
 })
 
+# On-disk HTTP cache: body + ETag/Last-Modified per URL, shared across runs
+CACHE_DIR = os.path.join(OUTPUT_DIR, ".cache")
+_cache_db = None
+_cache_lock = threading.Lock()  # shelve is not thread-safe; feeds are fetched concurrently
+_parsed_json = {}  # url -> parsed body, reused while the cached body is unchanged
+_changed_urls = set()  # urls whose body changed since the last pop_changed_urls()
+
+def _cache():
+    global _cache_db
+    if _cache_db is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _cache_db = shelve.open(os.path.join(CACHE_DIR, "http_cache"))
+    return _cache_db
+
+def cache_max_age(url):
+    """Seconds a cached body is served without asking upstream at all."""
+    if url == FIRMS_URL: return 600      # MODIS 24h file, regenerated a few times an hour
+    if url == EONET_URL: return 900
+    if url == NHC_URL: return 300
+    if "spc.noaa.gov" in url:
+        return 60 if "/today_" in url else 3600  # yesterday's reports are effectively final
+    return 0
+
+def cached_fetch(url, timeout=TIMEOUT):
+    """Return (body bytes, changed) for url, revalidating with If-None-Match/If-Modified-Since."""
+    with _cache_lock:
+        entry = _cache().get(url)
+    if entry and time.time() - entry["fetched"] < cache_max_age(url):
+        return entry["body"], False
+    headers = {}
+    if entry:
+        if entry["etag"]: headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]: headers["If-Modified-Since"] = entry["last_modified"]
+    r = SESSION.get(url, timeout=timeout, headers=headers)
+    if r.status_code == 304 and entry:
+        body, changed = entry["body"], False
+    else:
+        r.raise_for_status()
+        # Raw bytes: orjson parses them directly, text feeds decode in fetch_text
+        body = r.content
+        # Servers without validators answer 200 every time; compare bodies to be sure
+        changed = entry is None or body != entry["body"]
+    with _cache_lock:
+        _cache()[url] = {
+            "etag": r.headers.get("ETag") or (entry and entry["etag"]),
+            "last_modified": r.headers.get("Last-Modified") or (entry and entry["last_modified"]),
+            "body": body,
+            "fetched": time.time(),
+        }
+        _cache_db.sync()
+        if changed:
+            _changed_urls.add(url)
+    return body, changed
+
+def pop_changed_urls():
+    with _cache_lock:
+        changed = set(_changed_urls)
+        _changed_urls.clear()
+    return changed
+
+def _load_json(raw):
+    return orjson.loads(raw) if orjson else json.loads(raw)
 
 def fetch_json(url, timeout=TIMEOUT):
-    r = SESSION.get(url, timeout=timeout)
-    r.raise_for_status()
-    return r.json()
+    body, changed = cached_fetch(url, timeout=timeout)
+    if changed or url not in _parsed_json:
+        _parsed_json[url] = _load_json(body)
+    return _parsed_json[url]
 
 def fetch_text(url, timeout=TIMEOUT):
-    r = SESSION.get(url, timeout=timeout)
-    r.raise_for_status()
-    return r.text
+    body = cached_fetch(url, timeout=timeout)[0]
+    # Entries written before bodies were cached as bytes are already str
+    return body.decode("utf-8", errors="replace") if isinstance(body, bytes) else body
+
+# Upstream feeds
+RAINVIEWER_URL = "https://api.rainviewer.com/public/weather-maps.json"
+EONET_URL = "https://eonet.gsfc.nasa.gov/api/v3/events?status=open&category=volcanoes&limit=200"
+# Some query params yield 400 on /alerts/active; try simpler variants first
+NWS_URLS = [
+    "https://api.weather.gov/alerts/active"
+]
+USGS_URLS = [
+    "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/2.5_day.geojson",
+    "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/4.5_day.geojson",
+]
+FIRMS_URL = "https://firms.modaps.eosdis.nasa.gov/data/active_fire/c6.1/csv/MODIS_C6_1_Global_24h.csv"
+NHC_URL = "https://www.nhc.noaa.gov/CurrentStorms.json"
+
+RAINVIEWER_TTL = 60  # Seconds a fetched radar manifest is reused
+_RV_CACHE = {"ts": 0.0, "data": None}
+
+def get_rainviewer_manifest():
+    """RainViewer weather-maps manifest, refetched at most once per RAINVIEWER_TTL."""
+    if _RV_CACHE["data"] is None or time.monotonic() - _RV_CACHE["ts"] >= RAINVIEWER_TTL:
+        _RV_CACHE["data"] = fetch_json(RAINVIEWER_URL)
+        _RV_CACHE["ts"] = time.monotonic()
+    return _RV_CACHE["data"]
+
+def rainviewer_latest(maps):
+    """(tile_url, radar_time_str) for the newest radar frame in a manifest; tile_url None if empty."""
+    host = maps.get("host", "https://tilecache.rainviewer.com")
+    frames = (maps.get("radar", {}).get("past", []) or []) + (maps.get("radar", {}).get("nowcast", []) or [])
+    frame = frames[-1] if frames else None
+    if not frame or not frame.get("path"):
+        return None, None
+    tile_url = f"{host}{frame['path']}/256/{{z}}/{{x}}/{{y}}/2/1_1.png?color=3&smooth=1&noclutter=1"
+    ts = frame.get("time")
+    radar_time_str = datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime("%Y-%m-%d %H:%M UTC") if ts else None
+    return tile_url, radar_time_str
+
+def spc_feed_urls():
+    """SPC storm report CSVs per kind: today plus yesterday to cover UTC day changes."""
+    yday = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%y%m%d")
+    return {
+        kind: [
+            f"https://www.spc.noaa.gov/climo/reports/today_{kind_code}.csv",
+            f"https://www.spc.noaa.gov/climo/reports/{yday}_rpts_{kind_code}.csv",
+        ]
+        for kind, kind_code in (("tornado", "torn"), ("wind", "wind"), ("hail", "hail"))
+    }
+
+# NWS alert types drawn on the map, with their polygon colors
+NWS_EVENT_COLORS = {
+    "Tornado Warning": "#D50000",            # vivid red
+    "Tornado Watch": "#FF6D00",              # orange
+    "Severe Thunderstorm Warning": "#FFC107", # amber
+    "Severe Thunderstorm Watch": "#FFE082",   # light amber
+    "Flash Flood Warning": "#2E7D32",        # deep green
+    "Flood Warning": "#66BB6A",              # green
+    "Hurricane Warning": "#6A1B9A",          # deep purple
+    "Hurricane Watch": "#9C27B0",            # purple
+    "Tropical Storm Warning": "#0077BE",     # cyclone blue
+    "Winter Storm Warning": "#1565C0",       # strong blue
+    "Blizzard Warning": "#90CAF9",           # light blue
+    "Red Flag Warning": "#C62828",           # wildfire red
+    "Excessive Heat Warning": "#E53935",     # hot red
+    "High Wind Warning": "#9E9D24",          # olive
+    "Special Marine Warning": "#006D77",     # teal
+    "Tsunami Warning": "#004C8C",           # dark ocean blue
+    "Tsunami Advisory": "#1976D2",          # medium ocean blue
+    "Tsunami Watch": "#64B5F6",             # light ocean blue
+}
+
+def iter_nws_features(resp):
+    if ijson is not None:
+        # Parse feature by feature straight off the socket instead of building the whole document
+        resp.raw.decode_content = True
+        return ijson.items(resp.raw, "features.item", use_float=True)
+    return _load_json(resp.content).get("features", [])
+
+def fetch_nws_alerts():
+    """Active alerts; only NWS_EVENT_COLORS types are kept, so the rest can be freed as parsed."""
+    for url in NWS_URLS:
+        try:
+            with SESSION.get(url, timeout=20, stream=True) as resp:
+                if resp.status_code == 200:
+                    feats = [
+                        f for f in iter_nws_features(resp)
+                        if (f.get("properties") or {}).get("event") in NWS_EVENT_COLORS
+                    ]
+                    # Alerts aren't cached on disk; fingerprint id + update time to spot changes
+                    stamp = "|".join(f"{f.get('id')}@{(f.get('properties') or {}).get('sent')}" for f in feats)
+                    digest = hashlib.blake2b(stamp.encode(), digest_size=16).hexdigest()
+                    return {"features": feats, "digest": digest}
+                # Log brief error body to help debugging
+                body = resp.text[:200].replace("\n", " ")
+                print(f"NWS attempt {url} -> {resp.status_code}: {body}")
+        except Exception as e_inner:
+            print(f"NWS request failed for {url}: {e_inner}")
+    return None
+
+def fetch_spc_csv(url):
+    try:
+        return fetch_text(url)
+    except Exception:
+        return ""
+
+def spc_rows(texts):
+    """Data rows of SPC CSV bodies, parsed lazily; each body's header row is skipped."""
+    for txt in texts:
+        reader = csv.reader(io.StringIO(txt))
+        next(reader, None)
+        yield from reader
 
 def to_float(v):
     try:
@@ -60,87 +262,286 @@ def to_float(v):
     except Exception:
         return None
 
-def parse_lat(v):
-    if v is None: return None
-    if isinstance(v, (int, float)): return float(v)
-    s = str(v).strip().upper()
-    if s.endswith("N"): return to_float(s[:-1])
-    if s.endswith("S"):
-        val = to_float(s[:-1])
-        return -val if val is not None else None
-    return to_float(s)
-
-def parse_lon(v):
+# "25.4N", "-80.1", " 71.2 w " -> number and optional hemisphere letter
+_LL_RE = re.compile(r"^\s*([+-]?(?:\d+(?:\.\d*)?|\.\d+))\s*([NSEW]?)\s*$", re.IGNORECASE)
+_SIGN = {"": 1.0, "N": 1.0, "E": 1.0, "S": -1.0, "W": -1.0}
+
+def parse_latlon(v, lat=True):
+    """Parse a latitude (lat=True, N/S) or longitude (E/W) from a number or hemisphere string."""
     if v is None: return None
     if isinstance(v, (int, float)): return float(v)
-    s = str(v).strip().upper()
-    if s.endswith("E"): return to_float(s[:-1])
-    if s.endswith("W"):
-        val = to_float(s[:-1])
-        return -val if val is not None else None
-    return to_float(s)
+    m = _LL_RE.match(str(v))
+    if not m: return None
+    hemi = m.group(2).upper()
+    if hemi and hemi not in ("NS" if lat else "EW"): return None
+    return _SIGN[hemi] * float(m.group(1))
 
 # Region filters removed (always worldwide)
 
-# Generic lon/lat iterator for GeoJSON coords
-def iter_lonlat(coords):
-    if isinstance(coords, (list, tuple)):
-        if len(coords) >= 2 and all(isinstance(x, (int, float)) for x in coords[:2]):
-            yield coords
-        else:
-            for c in coords:
-                yield from iter_lonlat(c)
+# How deeply positions are nested in each GeoJSON geometry type's coordinates
+GEOM_DEPTH = {"Point": 0, "MultiPoint": 1, "LineString": 1, "MultiLineString": 2, "Polygon": 2, "MultiPolygon": 3}
+
+# Position arrays (N, 2+) for a geometry: one per ring/line so NumPy converts each in C
+def position_arrays(geom):
+    if not isinstance(geom, dict): return []
+    gtype = geom.get("type")
+    if gtype == "GeometryCollection":
+        return [a for g in geom.get("geometries") or [] for a in position_arrays(g)]
+    depth = GEOM_DEPTH.get(gtype)
+    coords = geom.get("coordinates")
+    if depth is None or not coords: return []
+    parts = [coords]
+    for _ in range(depth - 1):
+        parts = [p for part in parts for p in part]
+    return [np.atleast_2d(np.asarray(p, dtype=float)) for p in parts if len(p)]
+
+# Cheap check that a geometry has something to draw (no vertex traversal)
+def has_coords(geom):
+    if not isinstance(geom, dict): return False
+    if geom.get("type") == "GeometryCollection":
+        return any(has_coords(g) for g in geom.get("geometries") or [])
+    return bool(geom.get("coordinates"))
 
 # Compute bounds (min_lat, max_lat, min_lon, max_lon) for a GeoJSON geometry
 def geom_bounds(geom):
-    if not isinstance(geom, dict): return None
-    coords = list(iter_lonlat(geom.get("coordinates", [])))
-    if not coords: return None
-    lons = [to_float(c[0]) for c in coords if c and to_float(c[0]) is not None]
-    lats = [to_float(c[1]) for c in coords if c and to_float(c[1]) is not None]
-    if not lons or not lats: return None
-    return (min(lats), max(lats), min(lons), max(lons))
+    try:
+        arrays = position_arrays(geom)
+        if not arrays: return None
+        lonlat = np.concatenate([a[:, :2] for a in arrays])
+    except (ValueError, TypeError, IndexError):
+        return None  # ragged or non-numeric coordinates
+    lonlat = lonlat[np.isfinite(lonlat).all(axis=1)]
+    if not len(lonlat): return None
+    (min_lon, min_lat), (max_lon, max_lat) = lonlat.min(axis=0), lonlat.max(axis=0)
+    return (float(min_lat), float(max_lat), float(min_lon), float(max_lon))
+
+def quake_radius_km(M, depth_km):
+    """Approximate felt radius (km) for arrays of magnitudes and depths (NaN = unknown depth)."""
+    # Approximate felt area A (km^2): log10 A ≈ 1.02 M - 1.83 (Johnston 1996)
+    # radius_km = sqrt(A / pi)
+    radius_km = np.sqrt(10 ** (1.02 * M - 1.83) / pi)
+    # Depth attenuation: reduce area for deeper quakes
+    radius_km = radius_km * np.select([depth_km > 300, depth_km > 70], [0.5, 0.7], 1.0)
+    # Clamp to reasonable range
+    return np.clip(radius_km, 2.0, 300.0)
+
+# Tropical-storm radius tiers by sustained wind (kt): below each bound -> radius (km)
+TC_WIND_TIERS = [34, 50, 64, 83, 96, 113, 137]
+TC_WIND_RADII = [100.0, 150.0, 200.0, 250.0, 300.0, 350.0, 420.0, 500.0]  # ... Cat 1-5
+
+# Estimate radius dynamically from available metadata
+def estimate_tc_radius_km(storm):
+    # Try wind speed in knots
+    wind = to_float(storm.get("wind") or storm.get("maxWind") or storm.get("intensity") or storm.get("sustainedWind"))
+    if wind is not None:
+        return TC_WIND_RADII[bisect_right(TC_WIND_TIERS, max(0.0, wind))]
+    # Try Saffir-Simpson category if present
+    sshs = storm.get("sshs")
+    try:
+        if sshs is not None:
+            c = int(sshs)
+            return {0: 250.0, 1: 250.0, 2: 300.0, 3: 350.0, 4: 420.0, 5: 500.0}.get(c, 200.0)
+    except Exception:
+        pass
+    # Try status/class
+    status = (str(storm.get("type") or storm.get("stormType") or storm.get("class") or storm.get("status") or "")).upper()
+    if "TD" in status: return 120.0
+    if "TS" in status: return 200.0
+    if "HU" in status or "HURRICANE" in status: return 320.0
+    # Fallback
+    return float(STORM_RADIUS_KM)
 
 # Draw a soft-edged filled area by stacking concentric geodesic circles
+@lru_cache(maxsize=None)
+def faded_rings(steps, max_opacity):
+    """(radius fraction, opacity) per ring, smallest first; only a few (steps, max_opacity) pairs are used."""
+    steps = max(2, int(steps))
+    rings = []
+    for i in range(steps):
+        f = (i + 1) / steps
+        # Quadratic falloff for smoother fade to edge
+        opacity = max(0.0, max_opacity * (1.0 - (f ** 2)))
+        if opacity <= 0.01 and i < steps - 1:
+            continue
+        rings.append((f, round(opacity, 4)))
+    return tuple(rings)
+
 def add_faded_circle(layer, lat, lon, radius_m, color, steps=4, max_opacity=0.35):
     """Add concentric circles with decreasing opacity so the edge fades out.
     - steps: number of rings (>=2)
     - max_opacity: opacity at center ring; outer ring approaches 0
+    Callers pass numeric lat/lon (None is filtered upstream).
     """
-    try:
-        steps = max(2, int(steps))
-        for i in range(steps):
-            # Fraction of total radius (smaller first to larger last)
-            f = (i + 1) / steps
-            # Quadratic falloff for smoother fade to edge
-            opacity = max(0.0, max_opacity * (1.0 - (f ** 2)))
-            if opacity <= 0.01 and i < steps - 1:
-                continue
-            folium.Circle(
-                location=[lat, lon],
-                radius=radius_m * f,
-                color=color,
-                weight=0,
-                fill=True,
-                fill_color=color,
-                fill_opacity=opacity,
-            ).add_to(layer)
-    except Exception:
-        # Fallback to single circle if anything goes wrong
+    for f, opacity in faded_rings(steps, max_opacity):
         folium.Circle(
             location=[lat, lon],
-            radius=radius_m,
+            radius=radius_m * f,
             color=color,
             weight=0,
             fill=True,
             fill_color=color,
-            fill_opacity=max_opacity,
+            fill_opacity=opacity,
         ).add_to(layer)
 
-def build_map(auto_refresh: bool = False):
-    # Map (worldwide view)
-    center = [20.0, 0.0]
-    m = folium.Map(location=center, zoom_start=MAP_ZOOM, tiles="CartoDB positron")
+class FadedCircleBatch(MacroElement):
+    """Faded circles for many points, built in the browser from one [lat, lon, radius_m] array.
+
+    Dense layers (FIRMS, SPC) would otherwise render one folium.Circle per ring per point.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var layer = {{ this._parent.get_name() }};
+            var rings = {{ this.rings|tojson }};
+            {{ this.points|tojson }}.forEach(function (p) {
+                rings.forEach(function (ring) {
+                    L.circle([p[0], p[1]], {
+                        radius: p[2] * ring[0], color: {{ this.color|tojson }}, weight: 0,
+                        fill: true, fillColor: {{ this.color|tojson }}, fillOpacity: ring[1]
+                    }).addTo(layer);
+                });
+            });
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, points, color, steps=4, max_opacity=0.35):
+        super().__init__()
+        self._name = "FadedCircleBatch"
+        # Trim precision: ~10 m is plenty for footprints and keeps the page small
+        self.points = [[round(lat, 4), round(lon, 4), round(r, 1)] for lat, lon, r in points]
+        self.color = color
+        self.rings = faded_rings(steps, max_opacity)
+
+def prefetch_feeds():
+    """Start every feed download in the background; returns {source: future(s)}."""
+    ex = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    pending = {
+        "rainviewer": ex.submit(get_rainviewer_manifest),
+        "eonet": ex.submit(fetch_json, EONET_URL),
+        "nws": ex.submit(fetch_nws_alerts),
+        "spc": {kind: [ex.submit(fetch_spc_csv, u) for u in urls] for kind, urls in spc_feed_urls().items()},
+        "usgs": [ex.submit(fetch_json, u) for u in USGS_URLS],
+        "firms": ex.submit(fetch_text, FIRMS_URL),
+        "nhc": ex.submit(fetch_json, NHC_URL),
+    }
+    ex.shutdown(wait=False)  # queued fetches still run; nothing else is submitted
+    return pending
+
+def iter_futures(pending):
+    """Every future in a prefetch_feeds() result, however it is nested."""
+    for v in pending.values():
+        if isinstance(v, Future):
+            yield v
+        elif isinstance(v, dict):
+            for futs in v.values():
+                yield from futs
+        else:
+            yield from v
+
+def _swatch(color, label):
+    return (
+        f'<div style="display:flex;align-items:center;margin:3px 0;">'
+        f'<span style="display:inline-block;width:14px;height:14px;background:{color};opacity:0.9;'
+        f'border-radius:50%;margin-right:8px;border:1px solid rgba(0,0,0,0.25);"></span>'
+        f'<span>{label}</span>'
+        f'</div>'
+    )
+
+LEGEND_ITEMS = [
+    ("#E02D2D", "Wildfire area (FIRMS)"),
+    ("#7B1FA2", "Earthquake felt area (USGS approx.)"),
+    ("#0077BE", "Tropical cyclone area (approx.)"),
+    ("#B87333", "Volcano activity (EONET)"),
+    ("#D50000", "SPC Tornado report (~8 km)"),
+    ("#FFB300", "SPC Wind report (~6 km)"),
+    ("#00ACC1", "SPC Hail report (~5 km)"),
+]
+NWS_LEGEND_COLORS = {
+    "Tornado Warning": "#ff0000",
+    "Tornado Watch": "#ff7f00",
+    "Severe Thunderstorm Warning": "#ffa500",
+    "Severe Thunderstorm Watch": "#ffd37f",
+    "Flash Flood Warning": "#00aa00",
+    "Flood Warning": "#008000",
+    "Hurricane Warning": "#800080",
+    "Hurricane Watch": "#b266ff",
+    "Tropical Storm Warning": "#4b0082",
+    "Winter Storm Warning": "#1e90ff",
+    "Blizzard Warning": "#87cefa",
+    "Red Flag Warning": "#b22222",
+    "Excessive Heat Warning": "#e31a1c",
+    "High Wind Warning": "#9e9e00",
+    "Special Marine Warning": "#006d77",
+    "Tsunami Warning": "#0065bd",
+    "Tsunami Advisory": "#5aa7ff",
+    "Tsunami Watch": "#89c3ff",
+}
+
+# Map key shown inside the layers control. Only the radar timestamp changes between
+# refreshes, so the swatches are assembled once here and build_map fills __RADAR_TIME__.
+_LEGEND_STATIC_HTML = "".join(
+    [
+        '<div style="border-top:1px solid #ddd;margin:6px 0;"></div>',
+        '<div style="font-weight:600; margin:6px 0 4px;">Map Key</div>',
+        "__RADAR_TIME__",
+        *(_swatch(color, label) for color, label in LEGEND_ITEMS),
+        '<div style="margin:8px 0 4px; font-weight:600;">US Alerts (NWS polygons)</div>',
+        '<div style="max-height: 120px; overflow: auto; padding-right: 4px; border-left: 3px solid #eee; padding-left:8px;">',
+        *(_swatch(color, label) for label, color in NWS_LEGEND_COLORS.items()),
+        "</div>",
+    ]
+)
+_LEGEND_SCRIPT = """
+<script>
+(function() {
+  function addLegendToLayerControl() {
+    var ctl = document.querySelector('.leaflet-control-layers');
+    if (!ctl) return;
+    var list = ctl.querySelector('.leaflet-control-layers-list') || ctl;
+    var container = document.createElement('div');
+    container.className = 'legend-section';
+    container.style.marginTop = '4px';
+    container.innerHTML = `__LEGEND__`;
+    list.appendChild(container);
+  }
+  if (document.readyState === 'complete') { setTimeout(addLegendToLayerControl, 0); }
+  else { window.addEventListener('load', addLegendToLayerControl); }
+})();
+</script>
+""".replace("__LEGEND__", _LEGEND_STATIC_HTML)
+_AUTO_REFRESH_SCRIPT = f"<script>setTimeout(function(){{location.reload();}},{REFRESH_SECONDS*1000});</script>"
+
+class MapBuilder:
+    """One folium.Map kept across refreshes; refresh() swaps only its overlay layers."""
+
+    def __init__(self, auto_refresh: bool = False):
+        self.auto_refresh = auto_refresh
+        # Map (worldwide view). Tens of thousands of fire/quake/report rings are drawn on one
+        # shared <canvas> instead of an SVG path element each
+        center = [20.0, 0.0]
+        self.base_map = folium.Map(location=center, zoom_start=MAP_ZOOM, tiles="CartoDB positron", prefer_canvas=True)
+        # Everything present now (base tiles, page meta) survives every refresh
+        root = self.base_map.get_root()
+        self._keep = set(self.base_map._children)
+        self._keep_header = set(root.header._children)
+        self._keep_script = set(root.script._children)
+
+    def refresh(self, pending=None):
+        """Drop last cycle's layers and controls, then re-populate the base map."""
+        m = self.base_map
+        root = m.get_root()
+        m._children = {k: v for k, v in m._children.items() if k in self._keep}
+        # Each render files a header/script entry per element name; stale layers' entries
+        # would otherwise be written out again next to the new ones
+        root.header._children = {k: v for k, v in root.header._children.items() if k in self._keep_header}
+        root.script._children = {k: v for k, v in root.script._children.items() if k in self._keep_script}
+        return build_map(auto_refresh=self.auto_refresh, pending=pending, m=m)
+
+def build_map(auto_refresh: bool = False, pending=None, m=None):
+    """Populate m (a MapBuilder base map) with every overlay; a fresh one is made if m is None."""
+    if m is None:
+        return MapBuilder(auto_refresh).refresh(pending)
 
     # Layers
     layer_radar = folium.FeatureGroup(name="Radar (RainViewer)", overlay=True, control=True, show=True)
@@ -154,14 +555,15 @@ def build_map(auto_refresh: bool = False):
     counts = {"radar": 0, "nws": 0, "earthquakes": 0, "fires": 0, "storms": 0}
     radar_time_str = None
 
+    # Each section below waits only on its own future, so total fetch time is
+    # roughly the slowest feed rather than the sum of all of them
+    if pending is None:
+        pending = prefetch_feeds()
+
     # 1) Radar mosaic (RainViewer)
     try:
-        maps = fetch_json("https://api.rainviewer.com/public/weather-maps.json")
-        host = maps.get("host", "https://tilecache.rainviewer.com")
-        frames = (maps.get("radar", {}).get("past", []) or []) + (maps.get("radar", {}).get("nowcast", []) or [])
-        frame = frames[-1] if frames else None
-        if frame and frame.get("path"):
-            tile_url = f"{host}{frame['path']}/256/{{z}}/{{x}}/{{y}}/2/1_1.png?color=3&smooth=1&noclutter=1"
+        tile_url, radar_time_str = rainviewer_latest(pending["rainviewer"].result())
+        if tile_url:
             folium.TileLayer(
                 tiles=tile_url,
                 name="Radar (RainViewer latest)",
@@ -171,17 +573,13 @@ def build_map(auto_refresh: bool = False):
                 opacity=RADAR_OPACITY,
             ).add_to(layer_radar)
             counts["radar"] = 1
-            ts = frame.get("time")
-            if ts:
-                radar_time_str = datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
     except Exception as e:
         print(f"RainViewer error: {e}")
     layer_radar.add_to(m)
 
     # 2) Volcanoes (from EONET only for volcano category)
     try:
-        eonet_url = "https://eonet.gsfc.nasa.gov/api/v3/events?status=open&category=volcanoes&limit=200"
-        eonet = fetch_json(eonet_url)
+        eonet = pending["eonet"].result()
         vcount = 0
         for ev in eonet.get("events", []):
             title = ev.get("title") or "Volcano Activity"
@@ -190,6 +588,8 @@ def build_map(auto_refresh: bool = False):
                 if not coords or len(coords) < 2:
                     continue
                 lon, lat = to_float(coords[0]), to_float(coords[1])
+                if lat is None or lon is None:
+                    continue
                 # No region filtering; show worldwide
                 # Small faded circle to indicate activity
                 add_faded_circle(
@@ -213,107 +613,56 @@ def build_map(auto_refresh: bool = False):
 
     # 3) NWS US alert polygons (include tsunami-related alerts)
     try:
-        # Some query params yield 400 on /alerts/active; try simpler variants first
-        nws_data = None
-        nws_try_urls = [
-            "https://api.weather.gov/alerts/active"
-        ]
-        for url in nws_try_urls:
-            try:
-                resp = SESSION.get(url, timeout=20)
-                if resp.status_code == 200:
-                    nws_data = resp.json()
-                    break
-                else:
-                    # Log brief error body to help debugging
-                    body = resp.text[:200].replace("\n", " ")
-                    print(f"NWS attempt {url} -> {resp.status_code}: {body}")
-            except Exception as e_inner:
-                print(f"NWS request failed for {url}: {e_inner}")
-
+        nws_data = pending["nws"].result()
         if not nws_data:
             raise Exception("All NWS attempts failed")
 
         feats = nws_data.get("features", [])
-        include_events = {
-            "Tornado Warning": "#D50000",            # vivid red
-            "Tornado Watch": "#FF6D00",              # orange
-            "Severe Thunderstorm Warning": "#FFC107", # amber
-            "Severe Thunderstorm Watch": "#FFE082",   # light amber
-            "Flash Flood Warning": "#2E7D32",        # deep green
-            "Flood Warning": "#66BB6A",              # green
-            "Hurricane Warning": "#6A1B9A",          # deep purple
-            "Hurricane Watch": "#9C27B0",            # purple
-            "Tropical Storm Warning": "#0077BE",     # cyclone blue
-            "Winter Storm Warning": "#1565C0",       # strong blue
-            "Blizzard Warning": "#90CAF9",           # light blue
-            "Red Flag Warning": "#C62828",           # wildfire red
-            "Excessive Heat Warning": "#E53935",     # hot red
-            "High Wind Warning": "#9E9D24",          # olive
-            "Special Marine Warning": "#006D77",     # teal
-            "Tsunami Warning": "#004C8C",           # dark ocean blue
-            "Tsunami Advisory": "#1976D2",          # medium ocean blue
-            "Tsunami Watch": "#64B5F6",             # light ocean blue
-        }
-        nws_count = 0
+        # One FeatureCollection for every matched alert, carrying only geometry plus the
+        # color/tooltip it needs, so the page gets a single GeoJSON layer
+        matched = []
         for f in feats:
             props = f.get("properties", {})
             event = props.get("event")
             geom = f.get("geometry")
-            if not geom or event not in include_events:
+            if not geom or event not in NWS_EVENT_COLORS:
                 continue
-            bounds = geom_bounds(geom)
-            if bounds is None:
+            if not has_coords(geom):
                 continue
-            color = include_events[event]
-            def style_fn(_):
-                return {"color": color, "fillColor": color, "weight": 2, "fillOpacity": 0.25}
-            tooltip = f"{event}: {props.get('headline') or props.get('areaDesc') or ''}"
-            folium.GeoJson(f, name=event, style_function=style_fn, tooltip=tooltip).add_to(layer_nws)
-            nws_count += 1
-        counts["nws"] = nws_count
+            matched.append({
+                "type": "Feature",
+                "geometry": geom,
+                "properties": {
+                    "_color": NWS_EVENT_COLORS[event],
+                    "_tooltip": f"{event}: {props.get('headline') or props.get('areaDesc') or ''}",
+                },
+            })
+        if matched:
+            folium.GeoJson(
+                {"type": "FeatureCollection", "features": matched},
+                name="NWS alerts",
+                style_function=lambda f: {
+                    "color": f["properties"]["_color"],
+                    "fillColor": f["properties"]["_color"],
+                    "weight": 2,
+                    "fillOpacity": 0.25,
+                },
+                tooltip=folium.GeoJsonTooltip(fields=["_tooltip"], labels=False),
+            ).add_to(layer_nws)
+        counts["nws"] = len(matched)
     except Exception as e:
         print(f"NWS error: {e}")
     layer_nws.add_to(m)
 
     # 4) Severe Weather Reports (SPC LSR: tornado/wind/hail) — last 24h
     try:
-        import datetime as _dt
-
-        def fetch_spc_csv(url):
-            try:
-                txt = fetch_text(url)
-                return list(csv.reader(txt.splitlines()))
-            except Exception:
-                return []
-
-        # Three feeds for today; also attempt yesterday to cover UTC day changes
-        now_utc = _dt.datetime.now(_dt.timezone.utc)
-        today = now_utc.strftime("%y%m%d")
-        yday = (now_utc - _dt.timedelta(days=1)).strftime("%y%m%d")
-        feeds = {
-            "tornado": [
-                f"https://www.spc.noaa.gov/climo/reports/today_torn.csv",
-                f"https://www.spc.noaa.gov/climo/reports/{yday}_rpts_torn.csv",
-            ],
-            "wind": [
-                f"https://www.spc.noaa.gov/climo/reports/today_wind.csv",
-                f"https://www.spc.noaa.gov/climo/reports/{yday}_rpts_wind.csv",
-            ],
-            "hail": [
-                f"https://www.spc.noaa.gov/climo/reports/today_hail.csv",
-                f"https://www.spc.noaa.gov/climo/reports/{yday}_rpts_hail.csv",
-            ],
-        }
         colors = {"tornado": "#D50000", "wind": "#FFB300", "hail": "#00ACC1"}
         radii = {"tornado": 8000.0, "wind": 6000.0, "hail": 5000.0}
         lsr_count = 0
-        for kind, urls in feeds.items():
-            rows = []
-            for u in urls:
-                rows.extend(fetch_spc_csv(u))
-            # First row is header; expected columns include Lat,Lon near the end
-            for row in rows[1:]:
+        for kind, futs in pending["spc"].items():
+            points = []
+            # Expected columns include Lat,Lon near the end
+            for row in spc_rows(fut.result() for fut in futs):
                 if len(row) < 8:
                     continue
                 try:
@@ -324,16 +673,9 @@ def build_map(auto_refresh: bool = False):
                 if lat is None or lon is None:
                     continue
                 # No region filtering; show worldwide
-                add_faded_circle(
-                    layer_spc_lsr,
-                    lat,
-                    lon,
-                    radius_m=radii[kind],
-                    color=colors[kind],
-                    steps=3,
-                    max_opacity=0.25,
-                )
-                lsr_count += 1
+                points.append((lat, lon, radii[kind]))
+            FadedCircleBatch(points, color=colors[kind], steps=3, max_opacity=0.25).add_to(layer_spc_lsr)
+            lsr_count += len(points)
         counts["spc_lsr"] = lsr_count
     except Exception as e:
         print(f"SPC LSR error: {e}")
@@ -341,61 +683,46 @@ def build_map(auto_refresh: bool = False):
 
     # 5) Earthquakes affected areas (USGS) — circles sized by approximate felt area
     try:
-        eq_urls = [
-            "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/2.5_day.geojson",
-            "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/4.5_day.geojson",
-        ]
         n_quakes = 0
         results = []
-        try:
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
-                futs = {ex.submit(fetch_json, url): url for url in eq_urls}
-                for f in as_completed(futs):
-                    try:
-                        results.append(f.result())
-                    except Exception as _e:
-                        print(f"USGS fetch error: {_e}")
-        except Exception as _e:
-            print(f"USGS parallel error: {_e}")
+        for fut in pending["usgs"]:
+            try:
+                results.append(fut.result())
+            except Exception as _e:
+                print(f"USGS fetch error: {_e}")
 
+        # Gather every quake first so the radius math runs once over arrays
+        lats, lons, mags, depths = [], [], [], []
         for eq in results:
             for feature in (eq or {}).get("features", []):
                 coords = (feature.get("geometry") or {}).get("coordinates") or []
                 if len(coords) < 2:
                     continue
-                lat, lon = to_float(coords[1]), to_float(coords[0])
                 # No region filtering; show worldwide
-                mag = feature.get("properties", {}).get("mag")
-                if mag is None:
+                M = to_float(feature.get("properties", {}).get("mag"))
+                if M is None:
                     continue
-                try:
-                    M = float(mag)
-                except Exception:
+                lat, lon = to_float(coords[1]), to_float(coords[0])
+                if lat is None or lon is None:
                     continue
-                # Approximate felt area A (km^2): log10 A ≈ 1.02 M - 1.83 (Johnston 1996)
-                # radius_km = sqrt(A / pi)
-                A = 10 ** (1.02 * M - 1.83)
-                radius_km = (A / pi) ** 0.5
-                # Depth attenuation: reduce area for deeper quakes
                 depth_km = to_float(coords[2]) if len(coords) >= 3 else None
-                if depth_km is not None:
-                    if depth_km > 300:
-                        radius_km *= 0.5
-                    elif depth_km > 70:
-                        radius_km *= 0.7
-                # Clamp to reasonable range
-                radius_km = max(2.0, min(300.0, radius_km))
+                lats.append(lat)
+                lons.append(lon)
+                mags.append(M)
+                depths.append(float("nan") if depth_km is None else depth_km)
 
-                add_faded_circle(
-                    layer_quakes_area,
-                    lat,
-                    lon,
-                    radius_km * 1000.0,
-                    color="#7B1FA2",
-                    steps=5,
-                    max_opacity=0.30,
-                )
-                n_quakes += 1
+        radii_km = quake_radius_km(np.array(mags), np.array(depths))
+        for lat, lon, radius_km in zip(lats, lons, radii_km.tolist()):
+            add_faded_circle(
+                layer_quakes_area,
+                lat,
+                lon,
+                radius_km * 1000.0,
+                color="#7B1FA2",
+                steps=5,
+                max_opacity=0.30,
+            )
+            n_quakes += 1
         counts["earthquakes"] = n_quakes
     except Exception as e:
         print(f"USGS error: {e}")
@@ -403,87 +730,55 @@ def build_map(auto_refresh: bool = False):
 
     # 6) Wildfires (NASA FIRMS MODIS 24h) — red circles with real-world footprint
     try:
-        fires_url = "https://firms.modaps.eosdis.nasa.gov/data/active_fire/c6.1/csv/MODIS_C6_1_Global_24h.csv"
-        text = fetch_text(fires_url)
-        reader = csv.DictReader(text.splitlines())
-        n = 0
-        for row in reader:
-            lat = to_float(row.get("latitude"))
-            lon = to_float(row.get("longitude"))
-            # No region filtering; show worldwide
-
-            # Approximate sensor footprint radius in meters using scan/track in degrees if available
-            scan_deg = to_float(row.get("scan"))
-            track_deg = to_float(row.get("track"))
-            if scan_deg is not None and track_deg is not None and lat is not None:
-                # Convert degrees to meters (lon scales with cos(lat))
-                width_m = scan_deg * 111320.0 * max(0.0, cos(radians(lat)))
-                height_m = track_deg * 111320.0
-                # Area-equivalent circle radius
-                radius_m = sqrt(max(1.0, width_m * height_m) / pi)
-                # Keep radii within a reasonable range
-                radius_m = max(150.0, min(2000.0, radius_m))
-            else:
-                # MODIS nominal ~1km pixels -> ~564m radius area-equivalent; use 500m for clarity
-                radius_m = 500.0
-
-            add_faded_circle(
-                layer_fires_area,
-                lat,
-                lon,
-                radius_m,
-                color="#E02D2D",
-                steps=4,
-                max_opacity=0.35,
-            )
-            n += 1
-        counts["fires"] = n
+        text = pending["firms"].result()
+        fires = pd.read_csv(io.StringIO(text), usecols=["latitude", "longitude", "scan", "track"])
+        lat, lon, scan_deg, track_deg = (
+            pd.to_numeric(fires[c], errors="coerce").to_numpy(dtype=float)
+            for c in ("latitude", "longitude", "scan", "track")
+        )
+        # No region filtering; show worldwide
+
+        # Approximate sensor footprint radius in meters from scan/track in degrees, all rows at once
+        # Convert degrees to meters (lon scales with cos(lat))
+        width_m = scan_deg * 111320.0 * np.maximum(0.0, np.cos(np.radians(lat)))
+        height_m = track_deg * 111320.0
+        # Area-equivalent circle radius, kept within a reasonable range
+        radius_m = np.clip(np.sqrt(np.maximum(1.0, width_m * height_m) / pi), 150.0, 2000.0)
+        # Missing scan/track: MODIS nominal ~1km pixels -> ~564m radius area-equivalent; use 500m for clarity
+        radius_m = np.where(np.isnan(radius_m), 500.0, radius_m)
+
+        ok = ~(np.isnan(lat) | np.isnan(lon))
+        lat, lon, radius_m = lat[ok], lon[ok], radius_m[ok]
+
+        # Neighbouring pixels of one fire complex look identical at map scale: bucket them into
+        # a FIRMS_GRID_DEG grid and draw one circle per cell at the detections' centroid, sized
+        # max radius * sqrt(count) (area-equivalent) but no wider than a cell
+        cells = np.floor(lat / FIRMS_GRID_DEG).astype(np.int64) * 100000 + np.floor(lon / FIRMS_GRID_DEG).astype(np.int64)
+        _, cell_idx, cell_n = np.unique(cells, return_inverse=True, return_counts=True)
+        cell_lat = np.bincount(cell_idx, weights=lat) / cell_n
+        cell_lon = np.bincount(cell_idx, weights=lon) / cell_n
+        cell_r = np.zeros(len(cell_n))
+        np.maximum.at(cell_r, cell_idx, radius_m)
+        cell_r = np.minimum(cell_r * np.sqrt(cell_n), FIRMS_GRID_DEG * 111320.0)
+
+        points = list(zip(cell_lat.tolist(), cell_lon.tolist(), cell_r.tolist()))
+        FadedCircleBatch(points, color="#E02D2D", steps=4, max_opacity=0.35).add_to(layer_fires_area)
+        counts["fires"] = len(lat)
     except Exception as e:
         print(f"FIRMS error: {e}")
     layer_fires_area.add_to(m)
 
     # 7) Tropical cyclones as area circles (dynamic when possible)
     try:
-        storm_url = "https://www.nhc.noaa.gov/CurrentStorms.json"
-        data = fetch_json(storm_url)
+        data = pending["nhc"].result()
         storms = data.get("currentStorms") or data.get("activeStorms") or []
         for s in storms:
-            lat = parse_lat(s.get("lat"))
-            lon = parse_lon(s.get("lon"))
+            lat = parse_latlon(s.get("lat"), lat=True)
+            lon = parse_latlon(s.get("lon"), lat=False)
             if lat is None or lon is None:
                 continue
             # No region filtering; show worldwide
             name = s.get("name") or s.get("stormName") or "Storm"
-            # Estimate radius dynamically from available metadata
-            def estimate_tc_radius_km(storm):
-                # Try wind speed in knots
-                wind = to_float(storm.get("wind") or storm.get("maxWind") or storm.get("intensity") or storm.get("sustainedWind"))
-                if wind is not None:
-                    kts = max(0.0, float(wind))
-                    if kts < 34: return 100.0
-                    if kts < 50: return 150.0
-                    if kts < 64: return 200.0
-                    if kts < 83: return 250.0  # Cat 1
-                    if kts < 96: return 300.0  # Cat 2
-                    if kts < 113: return 350.0 # Cat 3
-                    if kts < 137: return 420.0 # Cat 4
-                    return 500.0               # Cat 5
-                # Try Saffir-Simpson category if present
-                sshs = s.get("sshs")
-                try:
-                    if sshs is not None:
-                        c = int(sshs)
-                        return {0: 250.0, 1: 250.0, 2: 300.0, 3: 350.0, 4: 420.0, 5: 500.0}.get(c, 200.0)
-                except Exception:
-                    pass
-                # Try status/class
-                status = (str(storm.get("type") or storm.get("stormType") or storm.get("class") or storm.get("status") or "")).upper()
-                if "TD" in status: return 120.0
-                if "TS" in status: return 200.0
-                if "HU" in status or "HURRICANE" in status: return 320.0
-                # Fallback
-                return float(STORM_RADIUS_KM)
-
             radius_km = estimate_tc_radius_km(s)
             # Clamp
             radius_km = max(60.0, min(600.0, radius_km))
@@ -507,79 +802,13 @@ def build_map(auto_refresh: bool = False):
 
     # Inject legend/key into the Layers control so there's only one box
     try:
-        # Build HTML that will be inserted inside the layers control
-        def _swatch(color, label):
-            return (
-                f'<div style="display:flex;align-items:center;margin:3px 0;">'
-                f'<span style="display:inline-block;width:14px;height:14px;background:{color};opacity:0.9;'
-                f'border-radius:50%;margin-right:8px;border:1px solid rgba(0,0,0,0.25);"></span>'
-                f'<span>{label}</span>'
-                f'</div>'
-            )
-
-        legend_items = [
-            ("#E02D2D", "Wildfire area (FIRMS)"),
-            ("#7B1FA2", "Earthquake felt area (USGS approx.)"),
-            ("#0077BE", "Tropical cyclone area (approx.)"),
-            ("#B87333", "Volcano activity (EONET)"),
-            ("#D50000", "SPC Tornado report (~8 km)"),
-            ("#FFB300", "SPC Wind report (~6 km)"),
-            ("#00ACC1", "SPC Hail report (~5 km)"),
-        ]
-        nws_legend_map = {
-            "Tornado Warning": "#ff0000",
-            "Tornado Watch": "#ff7f00",
-            "Severe Thunderstorm Warning": "#ffa500",
-            "Severe Thunderstorm Watch": "#ffd37f",
-            "Flash Flood Warning": "#00aa00",
-            "Flood Warning": "#008000",
-            "Hurricane Warning": "#800080",
-            "Hurricane Watch": "#b266ff",
-            "Tropical Storm Warning": "#4b0082",
-            "Winter Storm Warning": "#1e90ff",
-            "Blizzard Warning": "#87cefa",
-            "Red Flag Warning": "#b22222",
-            "Excessive Heat Warning": "#e31a1c",
-            "High Wind Warning": "#9e9e00",
-            "Special Marine Warning": "#006d77",
-            "Tsunami Warning": "#0065bd",
-            "Tsunami Advisory": "#5aa7ff",
-            "Tsunami Watch": "#89c3ff",
-        }
-
-        parts = []
-        parts.append('<div style="border-top:1px solid #ddd;margin:6px 0;"></div>')
-        parts.append('<div style="font-weight:600; margin:6px 0 4px;">Map Key</div>')
-        if radar_time_str:
-            parts.append(f'<div style="color:#555; margin-bottom:6px;">Radar: {radar_time_str}</div>')
-        for color, label in legend_items:
-            parts.append(_swatch(color, label))
-        parts.append('<div style="margin:8px 0 4px; font-weight:600;">US Alerts (NWS polygons)</div>')
-        parts.append('<div style="max-height: 120px; overflow: auto; padding-right: 4px; border-left: 3px solid #eee; padding-left:8px;">')
-        for label, color in nws_legend_map.items():
-            parts.append(_swatch(color, label))
-        parts.append('</div>')
-        legend_inner_html = "".join(parts)
-
-        script = f"""
-<script>
-(function() {{
-  function addLegendToLayerControl() {{
-    var ctl = document.querySelector('.leaflet-control-layers');
-    if (!ctl) return;
-    var list = ctl.querySelector('.leaflet-control-layers-list') || ctl;
-    var container = document.createElement('div');
-    container.className = 'legend-section';
-    container.style.marginTop = '4px';
-    container.innerHTML = `{legend_inner_html}`;
-    list.appendChild(container);
-  }}
-  if (document.readyState === 'complete') {{ setTimeout(addLegendToLayerControl, 0); }}
-  else {{ window.addEventListener('load', addLegendToLayerControl); }}
-}})();
-</script>
-"""
-        m.get_root().html.add_child(folium.Element(script))
+        radar_line = (
+            f'<div style="color:#555; margin-bottom:6px;">Radar: {radar_time_str}</div>' if radar_time_str else ""
+        )
+        # Named so a refresh of the same map replaces the previous key
+        m.get_root().html.add_child(
+            folium.Element(_LEGEND_SCRIPT.replace("__RADAR_TIME__", radar_line)), name="map_key"
+        )
     except Exception as e:
         print(f"Combined legend injection error: {e}")
 
@@ -587,28 +816,24 @@ def build_map(auto_refresh: bool = False):
     if auto_refresh:
         try:
             m.get_root().html.add_child(
-                folium.Element(
-                    f"<script>setTimeout(function(){{location.reload();}},{REFRESH_SECONDS*1000});</script>"
-                )
+                folium.Element(_AUTO_REFRESH_SCRIPT),
+                name="auto_refresh",
             )
         except Exception as e:
             print(f"Auto-refresh injection error: {e}")
 
     return m
 
-def build_quick_map(auto_refresh: bool = False):
+def build_quick_map(auto_refresh: bool = False, pending=None):
     """Fast-start map with only base and radar layer to reduce initial load time."""
     center = [20.0, 0.0]
     m = folium.Map(location=center, zoom_start=MAP_ZOOM, tiles="CartoDB positron")
     layer_radar = folium.FeatureGroup(name="Radar (RainViewer)", overlay=True, control=True, show=True)
     radar_time_str = None
     try:
-        maps = fetch_json("https://api.rainviewer.com/public/weather-maps.json")
-        host = maps.get("host", "https://tilecache.rainviewer.com")
-        frames = (maps.get("radar", {}).get("past", []) or []) + (maps.get("radar", {}).get("nowcast", []) or [])
-        frame = frames[-1] if frames else None
-        if frame and frame.get("path"):
-            tile_url = f"{host}{frame['path']}/256/{{z}}/{{x}}/{{y}}/2/1_1.png?color=3&smooth=1&noclutter=1"
+        maps = pending["rainviewer"].result() if pending else get_rainviewer_manifest()
+        tile_url, radar_time_str = rainviewer_latest(maps)
+        if tile_url:
             folium.TileLayer(
                 tiles=tile_url,
                 name="Radar (RainViewer latest)",
@@ -617,9 +842,6 @@ def build_quick_map(auto_refresh: bool = False):
                 control=True,
                 opacity=RADAR_OPACITY,
             ).add_to(layer_radar)
-            ts = frame.get("time")
-            if ts:
-                radar_time_str = datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
     except Exception as e:
         print(f"RainViewer (quick) error: {e}")
     layer_radar.add_to(m)
@@ -628,15 +850,60 @@ def build_quick_map(auto_refresh: bool = False):
 
     if auto_refresh:
         try:
-            m.get_root().html.add_child(
-                folium.Element(
-                    f"<script>setTimeout(function(){{location.reload();}},{REFRESH_SECONDS*1000});</script>"
-                )
-            )
+            m.get_root().html.add_child(folium.Element(_AUTO_REFRESH_SCRIPT))
         except Exception as e:
             print(f"Auto-refresh (quick) injection error: {e}")
     return m
 
+def save_map_atomic(m, filename):
+    """Save to a temp file beside filename, then swap it in so a reload never sees a partial page.
+
+    A gzip copy (filename + ".gz") is written alongside for the local map server.
+    """
+    # Same directory keeps os.replace a rename on one filesystem
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    m.save(tmp)
+    # Level 1: several-x smaller for a few ms of CPU
+    with open(tmp, "rb") as fi, gzip.open(tmp + ".gz", "wb", compresslevel=1) as fo:
+        shutil.copyfileobj(fi, fo)
+    os.replace(tmp + ".gz", filename + ".gz")
+    os.replace(tmp, filename)
+
+class MapRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves OUTPUT_DIR; answers .html requests with the .gz sidecar when the browser accepts gzip."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=OUTPUT_DIR, **kwargs)
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        gz_path = path + ".gz"
+        if path.endswith(".html") and "gzip" in self.headers.get("Accept-Encoding", "") and os.path.exists(gz_path):
+            f = open(gz_path, "rb")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return f
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass  # the page reloads every REFRESH_SECONDS; don't log each request
+
+def start_map_server(port=SERVE_PORT):
+    """Serve OUTPUT_DIR on localhost in a daemon thread; returns the base URL, or None."""
+    if not port:
+        return None
+    try:
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", port), MapRequestHandler)
+    except OSError as e:
+        print(f"Map server unavailable on port {port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}/"
+
 def write_timeline(*args, **kwargs):
     return None
 
@@ -649,30 +916,54 @@ def main():
     start = _time.monotonic()
     max_seconds = MAX_RUNTIME_HOURS * 3600 if MAX_RUNTIME_HOURS and MAX_RUNTIME_HOURS > 0 else None
     try:
+        last_full = None
+        last_nws_digest = None
+        builder = MapBuilder(auto_refresh=True)
         while True:
-            # Fast-start: generate a quick radar-only map first
-            try:
-                mq = build_quick_map(auto_refresh=True)
-                mq.save(MAP_FILENAME)
-                if not opened:
+            # Kick off all downloads now so they run while the quick map is built and saved
+            pending = prefetch_feeds()
+
+            # Fast-start: on the first pass, show a quick radar-only map while overlays load.
+            # Later passes keep the last full map on disk instead of replacing it.
+            if not opened:
+                try:
+                    mq = build_quick_map(auto_refresh=True, pending=pending)
+                    save_map_atomic(mq, MAP_FILENAME)
                     try:
                         import webbrowser
-                        webbrowser.open(f"file://{os.path.abspath(MAP_FILENAME)}")
+                        base_url = start_map_server()
+                        if base_url:
+                            webbrowser.open(base_url + os.path.basename(MAP_FILENAME))
+                        else:
+                            webbrowser.open(f"file://{os.path.abspath(MAP_FILENAME)}")
                     except Exception:
                         pass
                     opened = True
-                print(f"Updated (quick): {MAP_FILENAME}")
-            except Exception as e:
-                print(f"Quick map error: {e}")
-
-            # Then build the full map with all overlays
-            m = build_map(auto_refresh=True)
-            # Save snapshot and latest
-            try:
-                m.save(MAP_FILENAME)
-                print(f"Updated (full): {MAP_FILENAME}")
-            except Exception as e:
-                print(f"Save error: {e}")
+                    print(f"Updated (quick): {MAP_FILENAME}")
+                except Exception as e:
+                    print(f"Quick map error: {e}")
+
+            # Rebuild only when some feed actually changed (or the full map is getting old)
+            wait(list(iter_futures(pending)))
+            nws = pending["nws"].result()
+            nws_digest = nws.get("digest") if nws else None
+            changed = pop_changed_urls()
+            if nws_digest != last_nws_digest:
+                changed.add("nws")
+            stale = last_full is None or (_time.monotonic() - last_full) >= FULL_REBUILD_SECONDS
+            if changed or stale:
+                # Then build the full map with all overlays
+                m = builder.refresh(pending)
+                # Save snapshot and latest
+                try:
+                    save_map_atomic(m, MAP_FILENAME)
+                    print(f"Updated (full): {MAP_FILENAME}")
+                except Exception as e:
+                    print(f"Save error: {e}")
+                last_full = _time.monotonic()
+                last_nws_digest = nws_digest
+            else:
+                print("No feed changes; keeping the current full map.")
 
             # Wait for next refresh
             if max_seconds is not None and (_time.monotonic() - start) >= max_seconds: